@@ -0,0 +1,430 @@
+#!/usr/bin/env python
+"""asyncio flavour of the proxmoxlib read paths, power and migrate actions"""
+import asyncio
+import re
+from typing import Any
+from proxmoxer import ResourceException
+from proxmoxer import AuthenticationError
+from proxmoxlib import Proxmox
+from proxmoxlib import CachedTicketAuth
+from proxmoxlib import IP_UNKNOWN
+import proxcli_exceptions
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncProxmox():
+    """asyncio proxmox api helper
+
+    Provides the read methods of proxmoxlib.Proxmox as coroutines and
+    returns the same data as their output_format="internal" path. Per node
+    requests are gathered concurrently over a pooled http session.
+
+    Args:
+        proxmox (Proxmox): configured helper used for settings, host
+            selection, the ticket cache and data shaping
+        connections (int): maximum number of pooled http connections
+
+    Usage:
+        async with AsyncProxmox() as proxmox:
+            vms = await proxmox.get_vms(filter_name="^k8s-")
+    """
+
+    def __init__(self, proxmox=None, connections=32) -> None:
+        if aiohttp is None:
+            raise proxcli_exceptions.ProxmoxAsyncUnavailableException
+        self.proxmox = Proxmox() if proxmox is None else proxmox
+        self.connections = connections
+        self.session = None
+        self.base_url = ""
+        self.ticket = None
+        self.csrf_prevention_token = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        """select an active host, authenticate and open the http session"""
+        await asyncio.to_thread(self.proxmox.select_active_node)
+        self.base_url = f"https://{self.proxmox.host}:8006/api2/json"
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.connections, ssl=False)
+        )
+        ticket = self.proxmox.load_ticket()
+        if ticket:
+            self.ticket = ticket["ticket"]
+            self.csrf_prevention_token = ticket["csrf_prevention_token"]
+        else:
+            await self.login()
+
+    async def close(self) -> None:
+        """close the http session"""
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def login(self) -> None:
+        """get a new ticket with the configured password and cache it"""
+        async with self.session.post(
+            f"{self.base_url}/access/ticket",
+            data={
+                "username": self.proxmox.username,
+                "password": self.proxmox.password
+            }
+        ) as response:
+            data = (await response.json(content_type=None) or {}).get("data")
+        if not data:
+            raise AuthenticationError(
+                f"Couldn't authenticate user: {self.proxmox.username} "
+                f"to {self.base_url}/access/ticket"
+            )
+        self.ticket = data["ticket"]
+        self.csrf_prevention_token = data["CSRFPreventionToken"]
+        self.proxmox.save_ticket(CachedTicketAuth(
+            self.proxmox.username,
+            self.ticket,
+            self.csrf_prevention_token,
+            age=0
+        ))
+
+    async def request(self, method, path, relogin=True, **params) -> Any:
+        """
+        call the proxmox api
+
+            Parameters:
+                method (str): GET, POST, PUT or DELETE
+                path (str): api path relative to /api2/json
+                relogin (bool): log in again once if the ticket is rejected
+                params: query parameters or form data
+            Returns:
+                the data member of the api answer
+            Raises:
+                ResourceException: the api answered with an error
+        """
+        params = {
+            k: int(v) if isinstance(v, bool) else v
+            for k, v in params.items() if v is not None
+        }
+        # the ticket is set as a raw header, cookie jars quote its value
+        headers = {"Cookie": f"PVEAuthCookie={self.ticket}"}
+        if method != "GET":
+            headers["CSRFPreventionToken"] = self.csrf_prevention_token
+        in_query = method in ("GET", "DELETE")
+        async with self.session.request(
+            method,
+            f"{self.base_url}/{path}",
+            params=params if in_query else None,
+            data=None if in_query else params,
+            headers=headers
+        ) as response:
+            if response.status == 401 and relogin:
+                await self.login()
+                return await self.request(method, path, False, **params)
+            if response.status >= 400:
+                raise ResourceException(
+                    response.status,
+                    response.reason,
+                    await response.text()
+                )
+            return (await response.json(content_type=None) or {}).get("data")
+
+    async def get(self, path, **params) -> Any:
+        """GET shortcut"""
+        return await self.request("GET", path, **params)
+
+    async def post(self, path, **params) -> Any:
+        """POST shortcut"""
+        return await self.request("POST", path, **params)
+
+    # NODES #
+
+    async def get_nodes(self, filter_name=None) -> list:
+        """get all nodes as a list, see Proxmox.get_nodes"""
+        proxmox_nodes = await self.get("nodes")
+        proxmox_nodes = [] if not proxmox_nodes else proxmox_nodes
+        if filter_name:
+            proxmox_nodes = [
+                n for n in proxmox_nodes if self.proxmox.ismatching(
+                    filter_name, n["node"]
+                )
+            ]
+        return proxmox_nodes
+
+    async def get_tasks(
+            self,
+            errors=0,
+            limit=50,
+            source="all",
+            proxmox_nodes=None,
+            **filters
+    ) -> dict:
+        """get the newest tasks of the cluster nodes, see Proxmox.get_tasks
+        filters are the since, until, typefilter, vmid and statusfilter
+        api parameters"""
+        proxmox_nodes = self.proxmox.select_online_nodes(
+            await self.get_nodes(),
+            proxmox_nodes
+        )
+        filters = {k: v for k, v in filters.items() if v is not None}
+        results = await asyncio.gather(*[
+            asyncio.wait_for(
+                self.get(
+                    f"nodes/{node}/tasks",
+                    errors=errors,
+                    limit=limit,
+                    source=source,
+                    **filters
+                ),
+                timeout=self.proxmox.node_timeout
+            ) for node in proxmox_nodes
+        ], return_exceptions=True)
+        node_tasks = []
+        failed = []
+        for node, result in zip(proxmox_nodes, results):
+            if isinstance(result, Exception):
+                failed.append((node, result))
+                continue
+            node_tasks.append([] if not result else result)
+        self.proxmox.report_failed_nodes("tasks", failed)
+        return self.proxmox.with_failed_nodes(
+            "tasks",
+            self.proxmox.format_tasks(node_tasks, limit),
+            failed
+        )
+
+    async def get_nodes_network(self, proxmox_nodes=None) -> dict:
+        """get nodes network configuration, see Proxmox.get_nodes_network"""
+        if proxmox_nodes == "all":
+            proxmox_nodes = self.proxmox.select_online_nodes(
+                await self.get_nodes()
+            )
+        else:
+            proxmox_nodes = proxmox_nodes.split(",") if proxmox_nodes else []
+        results = await asyncio.gather(*[
+            asyncio.wait_for(
+                self.get(f"nodes/{node}/network"),
+                timeout=self.proxmox.node_timeout
+            ) for node in proxmox_nodes
+        ], return_exceptions=True)
+        networks = []
+        failed = []
+        for node, result in zip(proxmox_nodes, results):
+            if isinstance(result, Exception):
+                failed.append((node, result))
+                continue
+            for net in [] if not result else result:
+                net["node"] = node
+                networks.append(net)
+        self.proxmox.report_failed_nodes("network", failed)
+        return self.proxmox.with_failed_nodes("networks", networks, failed)
+
+    # CLUSTER #
+
+    async def get_cluster_log(
+            self,
+            proxmox_nodes,
+            severities,
+            max_items=100
+    ) -> Any:
+        """get cluster logs, see Proxmox.get_cluster_log"""
+        logs = await self.get("cluster/log", max=max_items)
+        filtered_logs = self.proxmox.filter_cluster_log(
+            logs,
+            proxmox_nodes=proxmox_nodes,
+            severities=severities
+        )
+        if len(filtered_logs) == 0:
+            return None
+        return filtered_logs
+
+    async def get_ha_resources(self, filter_name="^.*$", group=None) -> list:
+        """get ha resources named after their vm, see
+        Proxmox.get_ha_resources"""
+        resources, vms = await asyncio.gather(
+            self.get("cluster/ha/resources"),
+            self.get_vms_snapshot()
+        )
+        resources = list(self.proxmox.join_ha_resources(
+            resources,
+            self.proxmox.build_vms_index(vms)
+        ).values())
+        resources = [r for r in resources if re.match(filter_name, r["name"])]
+        if group:
+            resources = [r for r in resources if r["group"] == group]
+        return resources
+
+    # VMS #
+
+    async def get_vms_snapshot(self, guest_types=("qemu",)) -> list:
+        """guests from a single /cluster/resources call"""
+        try:
+            resources = await self.get("cluster/resources", type="vm")
+        except ResourceException:
+            return await self.get_vms_per_node()
+        return self.proxmox.vms_from_resources(
+            [] if not resources else resources,
+            guest_types
+        )
+
+    async def get_vms_per_node(self) -> list:
+        """qemu vms gathered from every online node"""
+        proxmox_nodes = self.proxmox.select_online_nodes(
+            await self.get_nodes()
+        )
+        results = await asyncio.gather(*[
+            self.get(f"nodes/{node}/qemu") for node in proxmox_nodes
+        ])
+        vms = []
+        for node, guests in zip(proxmox_nodes, results):
+            for virtual_machine in [] if not guests else guests:
+                virtual_machine["node"] = node
+                virtual_machine["type"] = "qemu"
+                vms.append(virtual_machine)
+        return self.proxmox.vms_from_resources(vms)
+
+    async def get_vm_public_ip(
+            self,
+            proxmox_node,
+            vmid,
+            net_type="ipv4"
+    ) -> list:
+        """get vm ip addresses from its guest agent"""
+        interfaces = None
+        try:
+            result = await self.get(
+                f"nodes/{proxmox_node}/qemu/{vmid}/agent/"
+                f"network-get-interfaces"
+            )
+            interfaces = result["result"]
+        except ResourceException:
+            pass
+        return self.proxmox.parse_vm_interfaces(interfaces, net_type)
+
+    async def resolve_vms_public_ip(self, vms) -> list:
+        """
+        add the ip key to each vm of the list, guest agents are queried
+        concurrently with the [agent] workers and timeout settings
+        """
+        semaphore = asyncio.Semaphore(self.proxmox.agent_workers)
+
+        async def resolve(virtual_machine):
+            async with semaphore:
+                try:
+                    virtual_machine["ip"] = await asyncio.wait_for(
+                        self.get_vm_public_ip(
+                            virtual_machine["node"],
+                            virtual_machine["vmid"]
+                        ),
+                        timeout=self.proxmox.agent_timeout
+                    )
+                except Exception:  # pylint: disable=broad-except
+                    virtual_machine["ip"] = IP_UNKNOWN
+
+        for virtual_machine in vms:
+            virtual_machine["ip"] = []
+        await asyncio.gather(*[
+            resolve(v) for v in vms if v["status"] == "running"
+        ])
+        return vms
+
+    async def get_vms(
+            self,
+            filter_name=None,
+            proxmox_nodes=None,
+            status="stopped,running"
+    ) -> list:
+        """list qemu vms with their ip addresses, see Proxmox.get_vms"""
+        vms = self.proxmox.filter_vms(
+            await self.get_vms_snapshot(),
+            filter_name=filter_name,
+            proxmox_nodes=proxmox_nodes,
+            status=status
+        )
+        return await self.resolve_vms_public_ip(vms)
+
+    async def select_vms(self, filter_name=None, vmid=None) -> list:
+        """vms matching a name filter or a vmid"""
+        vms = self.proxmox.filter_vms(
+            await self.get_vms_snapshot(),
+            filter_name=filter_name
+        )
+        if vmid:
+            vms = [v for v in vms if v["vmid"] == int(vmid)]
+        return vms
+
+    async def set_vms_status(
+            self,
+            status=None,
+            filter_name=None,
+            vmid=None
+    ) -> list:
+        """
+        set status (start, stop, reset, suspend, shutdown) of vms matching
+        filter or vmid
+            Returns:
+                list of task identifiers
+        """
+        vms = await self.select_vms(filter_name=filter_name, vmid=vmid)
+        return list(await asyncio.gather(*[
+            self.post(f"nodes/{v['node']}/qemu/{v['vmid']}/status/{status}")
+            for v in vms
+        ]))
+
+    async def migrate_vms(
+            self,
+            proxmox_node,
+            filter_name=None,
+            vmid=None
+    ) -> list:
+        """
+        migrate vms matching filter or vmid to proxmox_node
+            Returns:
+                list of task identifiers
+        """
+        if filter_name and vmid:
+            raise proxcli_exceptions.VmIdMutualyExclusiveException
+        vms = await self.select_vms(filter_name=filter_name, vmid=vmid)
+        if vmid and len(vms) == 0:
+            raise proxcli_exceptions.ProxmoxVmNotFoundException
+        vms = [v for v in vms if v["node"] != proxmox_node]
+        return list(await asyncio.gather(*[
+            self.post(
+                f"nodes/{v['node']}/qemu/{v['vmid']}/migrate",
+                target=proxmox_node
+            ) for v in vms
+        ]))
+
+    # STORAGE #
+
+    async def get_storage_content(
+        self,
+        proxmox_node,
+        storage,
+        content_type="",
+        content_format="",
+        filter_orphaned="YES,NO,N/A",
+        vmid=None
+    ) -> list:
+        """get storage content list, see Proxmox.get_storage_content"""
+        contents = [c for c in content_type.split(",") if c] or [None]
+        *results, vms = await asyncio.gather(*[
+            self.get(
+                f"nodes/{proxmox_node}/storage/{storage}/content",
+                content=content,
+                vmid=vmid
+            ) for content in contents
+        ], self.get_vms_snapshot(("qemu", "lxc")))
+        return self.proxmox.filter_storage_content(
+            [v for volumes in results for v in volumes or []],
+            content_type=content_type,
+            content_format=content_format,
+            filter_orphaned=filter_orphaned,
+            vmids={v["vmid"] for v in vms}
+        )
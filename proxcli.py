@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 """Proxcli is a remote proxmox cluster management tool"""
+import json
 import sys
 import typer
 from typing_extensions import Annotated
+from rich import print as rprint
 from proxmoxlib import Proxmox
 from stack_operations import StackOperations
 import proxcli_exceptions
@@ -52,6 +54,32 @@ cluster.add_typer(ha, name="ha", help="high availibility commands")
 
 p = Proxmox()
 
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    stats: Annotated[bool, typer.Option(
+        help="print api calls made and avoided by the cache on exit"
+    )] = False,
+    max_age: Annotated[int, typer.Option(
+        help="use on disk cached cluster data not older than max-age seconds"
+    )] = None,
+    refresh: Annotated[bool, typer.Option(
+        help="ignore on disk cached cluster data and fetch it again"
+    )] = False
+):
+    """Proxcli is a remote proxmox cluster management tool"""
+    p.set_cache_policy(max_age=max_age, refresh=refresh)
+    if stats:
+        ctx.call_on_close(
+            lambda: print(
+                ", ".join(
+                    [f"{k}: {v}" for k, v in p.get_api_stats().items()]
+                ),
+                file=sys.stderr
+            )
+        )
+
 # STACK
 
 
@@ -158,12 +186,26 @@ def cluster_log(
     output_format: Annotated[str, typer.Option()] = "table",
     max_items: int = 100,
     proxmox_nodes: str = "pve1,pve2,pve3",
-    severities: str = "panic,alert,critical,error,warning,notice,info,debug"
+    severities: str = "panic,alert,critical,error,warning,notice,info,debug",
+    follow: Annotated[bool, typer.Option()] = False,
+    interval: Annotated[float, typer.Option()] = 2
 ) -> None:
     """Show cluster logs
-        Parameters:
-        Returns:
+    with --follow, new entries are streamed as table rows or ndjson
+    (--output-format ndjson)
     """
+    if follow:
+        follow_rows(
+            p.follow_cluster_log(
+                proxmox_nodes=proxmox_nodes,
+                severities=severities,
+                interval=interval,
+                max_items=max_items
+            ),
+            p.headers_cluster_log,
+            output_format
+        )
+        return
     p.get_cluster_log(
         output_format=output_format,
         max_items=max_items,
@@ -172,9 +214,22 @@ def cluster_log(
 
 
 @storages.command("list")
-def storage_list():
-    """list storages"""
-    p.get_storages(output_format="table")
+def storage_list(
+    output_format: Annotated[str, typer.Option()] = "table",
+    proxmox_nodes: Annotated[str, typer.Option()] = "",
+    sort_by: Annotated[str, typer.Option()] = "storage",
+    reverse: Annotated[bool, typer.Option()] = False,
+    min_used: Annotated[float, typer.Option()] = None
+):
+    """list storages capacity per node, --min-used 0.85 keeps the
+    storages used at 85% or more"""
+    p.get_storages(
+        output_format=output_format,
+        proxmox_nodes=proxmox_nodes,
+        sort_by=sort_by,
+        reverse=reverse,
+        min_used=min_used
+    )
 
 
 @ha_groups.command("list")
@@ -368,7 +423,7 @@ def vms_set(
     sshkey: Annotated[str, typer.Option] = ""
 ):
     """set vm parameters"""
-    p.set_vms(
+    summary = p.set_vms(
         vmid=vmid,
         filter_name=filter_name,
         vmname=vmname,
@@ -383,6 +438,15 @@ def vms_set(
         boot=boot,
         sshkey=sshkey
     )
+    for vm in summary["changed"]:
+        rprint(f"{vm['name']} ({vm['vmid']}): {', '.join(vm['keys'])}")
+    for vm in summary["failed"]:
+        rprint(f"[red]{vm['name']} ({vm['vmid']}): {vm['error']}[/red]")
+    rprint(
+        f"{len(summary['changed'])} changed, "
+        f"{len(summary['unchanged'])} unchanged, "
+        f"{len(summary['failed'])} failed"
+    )
 
 
 @vms.command("migrate")
@@ -422,49 +486,122 @@ def vms_next_id():
 @vms.command("start")
 def vms_start(
     filter_name: Annotated[str, typer.Option()] = "",
-    vmid: Annotated[int, typer.Option()] = -1
+    vmid: Annotated[int, typer.Option()] = -1,
+    wait: Annotated[bool, typer.Option()] = False,
+    timeout: Annotated[int, typer.Option()] = None,
+    workers: Annotated[int, typer.Option()] = None,
+    node_workers: Annotated[int, typer.Option()] = None,
+    waves: Annotated[bool, typer.Option()] = False,
+    wave_size: Annotated[int, typer.Option()] = None
 ):
-    """start vms based on a regexp filter on name or by vmid"""
+    """start vms based on a regexp filter on name or by vmid
+    with --waves, stopped vms matching the filter are started in waves
+    per shared storage (or node for local disks), each wave is waited for"""
+    if waves:
+        if vmid != -1:
+            print("You can't start a single vmid in waves, use a filter")
+            raise typer.Exit(code=1)
+        vms_status_summary("start", p.start_vms_in_waves(
+            filter_name=filter_name,
+            wave_size=wave_size,
+            workers=workers,
+            node_workers=node_workers,
+            timeout=timeout
+        ))
+        return
     vms_status_apply(
         filter_name,
         vmid,
-        "start"
+        "start",
+        wait=wait,
+        timeout=timeout,
+        workers=workers,
+        node_workers=node_workers
     )
 
 
 @vms.command("stop")
 def vms_stop(
     filter_name: Annotated[str, typer.Option()] = "",
-    vmid: Annotated[int, typer.Option()] = -1
+    vmid: Annotated[int, typer.Option()] = -1,
+    wait: Annotated[bool, typer.Option()] = False,
+    timeout: Annotated[int, typer.Option()] = None,
+    workers: Annotated[int, typer.Option()] = None,
+    node_workers: Annotated[int, typer.Option()] = None
 ):
     """stop vms based on a regexp filter on name or by vmid"""
     vms_status_apply(
         filter_name,
         vmid,
-        "stop"
+        "stop",
+        wait=wait,
+        timeout=timeout,
+        workers=workers,
+        node_workers=node_workers
+    )
+
+
+@vms.command("shutdown")
+def vms_shutdown(
+    filter_name: Annotated[str, typer.Option()] = "",
+    vmid: Annotated[int, typer.Option()] = -1,
+    wait: Annotated[bool, typer.Option()] = False,
+    timeout: Annotated[int, typer.Option()] = None,
+    workers: Annotated[int, typer.Option()] = None,
+    node_workers: Annotated[int, typer.Option()] = None
+):
+    """gracefully shutdown vms based on a regexp filter on name or by vmid"""
+    vms_status_apply(
+        filter_name,
+        vmid,
+        "shutdown",
+        wait=wait,
+        timeout=timeout,
+        workers=workers,
+        node_workers=node_workers
     )
 
 
 @vms.command("reset")
 def vms_reset(
     filter_name: Annotated[str, typer.Option()] = "",
-    vmid: Annotated[int, typer.Option()] = -1
+    vmid: Annotated[int, typer.Option()] = -1,
+    wait: Annotated[bool, typer.Option()] = False,
+    timeout: Annotated[int, typer.Option()] = None,
+    workers: Annotated[int, typer.Option()] = None,
+    node_workers: Annotated[int, typer.Option()] = None
 ):
     """reset vms based on a regexp filter on name or by vmid"""
     vms_status_apply(
         filter_name,
         vmid,
-        "reset"
+        "reset",
+        wait=wait,
+        timeout=timeout,
+        workers=workers,
+        node_workers=node_workers
     )
 
 
 @vms.command("suspend")
 def vms_suspend(
     filter_name: Annotated[str, typer.Option()] = "",
-    vmid: Annotated[int, typer.Option()] = -1
+    vmid: Annotated[int, typer.Option()] = -1,
+    wait: Annotated[bool, typer.Option()] = False,
+    timeout: Annotated[int, typer.Option()] = None,
+    workers: Annotated[int, typer.Option()] = None,
+    node_workers: Annotated[int, typer.Option()] = None
 ):
-    """reset vms based on a regexp filter on name or by vmid    """
-    vms_status_apply(filter_name, vmid, "reset")
+    """suspend vms based on a regexp filter on name or by vmid"""
+    vms_status_apply(
+        filter_name,
+        vmid,
+        "suspend",
+        wait=wait,
+        timeout=timeout,
+        workers=workers,
+        node_workers=node_workers
+    )
 
 
 @vms.command("clone")
@@ -500,7 +637,10 @@ def vms_delete(
     filter_name: Annotated[str, typer.Option()] = "",
     vmid: Annotated[int, typer.Option()] = -1,
     confirm: Annotated[bool, typer.Option()] = False,
-    block: Annotated[bool, typer.Option()] = False
+    block: Annotated[bool, typer.Option()] = False,
+    stop: Annotated[bool, typer.Option()] = False,
+    timeout: Annotated[int, typer.Option()] = None,
+    workers: Annotated[int, typer.Option()] = None
 ):
     """delete vms matching regex filter applied on vm name or by vmid.
     vmid and filter are mutualy exclusive"""
@@ -522,23 +662,54 @@ def vms_delete(
             )
         if not confirm:
             raise typer.Abort()
-    p.output(
-        output_format="internal",
-        data=p.delete_vms(
-            fitler_name=filter_name,
-            vmid=vmid,
-            block=block
-        )
-    )
+    vms_status_summary("delete", p.delete_vms(
+        fitler_name=filter_name,
+        vmid=vmid,
+        block=block,
+        stop=stop,
+        timeout=timeout,
+        workers=workers
+    ))
 
 
-def vms_status_apply(filter_name, vmid, status):
+def vms_status_apply(filter_name, vmid, status, **options):
     """apply a status to a vm (start, stop, suspend ....)"""
     vmid = None if int(vmid) == -1 else vmid
     if vmid and filter_name:
         print("You can't specify a filter and a vmid at the same time")
-    else:
-        p.set_vms_status(status=status, filter_name=filter_name, vmid=vmid)
+        return
+    vms_status_summary(status, p.set_vms_status(
+        status=status,
+        filter_name=filter_name,
+        vmid=vmid,
+        **options
+    ))
+
+
+def vms_status_summary(status, summary):
+    """print the outcome of a bulk power action"""
+    if not summary:
+        print("No vm found")
+        return
+    for vm in summary["failed"]:
+        rprint(f"[red]{status} {vm['name']} ({vm['vmid']}) on {vm['node']} "
+               f"failed: {vm['error']}[/red]")
+    for vm in summary["timeout"]:
+        rprint(f"[yellow]{status} {vm['name']} ({vm['vmid']}) on "
+               f"{vm['node']} timed out[/yellow]")
+    for vm in summary.get("skipped", []):
+        rprint(f"[yellow]{status} {vm['name']} ({vm['vmid']}) on "
+               f"{vm['node']} skipped, vm is {vm['status']}[/yellow]")
+    rprint(
+        f"{status}: {len(summary['succeeded'])} succeeded, "
+        f"{len(summary['failed'])} failed, "
+        f"{len(summary['timeout'])} timed out" + (
+            f", {len(summary['skipped'])} skipped"
+            if "skipped" in summary else ""
+        )
+    )
+    if summary["failed"] or summary["timeout"]:
+        raise typer.Exit(code=1)
 
 
 @tags.command("set")
@@ -548,7 +719,18 @@ def tags_set(
     filter_name: Annotated[str, typer.Option()] = "^.*"
 ):
     """set vm tags"""
-    p.set_tags(tags=vm_tags, filter_name=filter_name, set_mode=set_mode)
+    summary = p.set_tags(
+        tags=vm_tags,
+        filter_name=filter_name,
+        set_mode=set_mode
+    )
+    for vm in summary["failed"]:
+        rprint(f"[red]{vm['name']} ({vm['vmid']}): {vm['error']}[/red]")
+    rprint(
+        f"{len(summary['changed'])} changed, "
+        f"{len(summary['unchanged'])} unchanged, "
+        f"{len(summary['failed'])} failed"
+    )
 
 
 @tags.command("list")
@@ -572,27 +754,100 @@ def nodes_list(
 @networks.command("list")
 def networks_list(
     proxmox_nodes: Annotated[str, typer.Option()],
-    output_format: Annotated[str, typer.Option()] = "table"
+    output_format: Annotated[str, typer.Option()] = "table",
+    timeout: Annotated[float, typer.Option()] = None
 ):
-    """list all network for a subset of nodes"""
+    """list all network for a subset of nodes, coma separated or "all"
+    nodes are queried concurrently, the ones that do not answer within
+    timeout seconds are reported"""
 
     p.get_nodes_network(
         proxmox_nodes=proxmox_nodes,
-        output_format=output_format
+        output_format=output_format,
+        timeout=timeout
     )
 
 
 @nodes.command("tasks")
 def tasks_list(
-    proxmox_nodes: Annotated[str, typer.Option()]
+    proxmox_nodes: Annotated[str, typer.Option()] = "",
+    limit: Annotated[int, typer.Option()] = 50,
+    errors: Annotated[bool, typer.Option()] = False,
+    source: Annotated[str, typer.Option()] = "all",
+    since: Annotated[int, typer.Option()] = None,
+    until: Annotated[int, typer.Option()] = None,
+    typefilter: Annotated[str, typer.Option()] = None,
+    vmid: Annotated[int, typer.Option()] = None,
+    statusfilter: Annotated[str, typer.Option()] = None,
+    follow: Annotated[bool, typer.Option()] = False,
+    interval: Annotated[float, typer.Option()] = 2,
+    output_format: Annotated[str, typer.Option()] = "table"
 ):
-    """list nodes tasks"""
+    """list the newest nodes tasks, since and until are unix timestamps
+    with --follow, new and finished tasks are streamed as table rows or
+    ndjson (--output-format ndjson)"""
+    if output_format == "ndjson" and not follow:
+        print("ndjson output is only available with --follow")
+        raise typer.Exit(code=1)
+    if follow:
+        tasks_follow(
+            p.follow_tasks(
+                proxmox_nodes=proxmox_nodes,
+                interval=interval,
+                limit=limit,
+                errors=1 if errors else 0,
+                typefilter=typefilter,
+                vmid=vmid,
+                statusfilter=statusfilter
+            ),
+            output_format
+        )
+        return
     p.get_tasks(
-        output_format="table",
-        proxmox_nodes=proxmox_nodes
+        output_format=output_format,
+        proxmox_nodes=proxmox_nodes,
+        limit=limit,
+        errors=1 if errors else 0,
+        source=source,
+        since=since,
+        until=until,
+        typefilter=typefilter,
+        vmid=vmid,
+        statusfilter=statusfilter
     )
 
 
+def tasks_follow(events, output_format):
+    """print followed tasks until interrupted"""
+    def rows():
+        for event, task in events:
+            if output_format != "ndjson":
+                task = dict(task)
+                for key in ("starttime", "endtime"):
+                    task[key] = (
+                        p.readable_date(task[key]) if key in task else ""
+                    )
+            yield dict(task, event=event)
+    follow_rows(rows(), ["event"] + p.headers_tasks, output_format)
+
+
+def follow_rows(rows, headers, output_format):
+    """print streamed rows as aligned columns or ndjson until interrupted"""
+    if output_format != "ndjson":
+        print("  ".join(f"{h:<20}" for h in headers))
+    try:
+        for row in rows:
+            if output_format == "ndjson":
+                print(json.dumps(row), flush=True)
+            else:
+                print(
+                    "  ".join(f"{str(row.get(h, '')):<20}" for h in headers),
+                    flush=True
+                )
+    except KeyboardInterrupt:
+        pass
+
+
 # INVENTORY #
 
 
@@ -645,16 +900,57 @@ def storages_upload(
     storage: Annotated[str, typer.Option()],
     proxmox_node: Annotated[str, typer.Option()],
     content: Annotated[str, typer.Option()] = "iso",
+    block: Annotated[bool, typer.Option()] = True
 ):
-    """upload iso or disk image to proxmox nodes"""
+    """upload iso or disk image to proxmox nodes
+    the file is streamed with a progress bar and its sha256 checksum is
+    verified by the node"""
     p.storages_upload(
         file=file,
         storage=storage,
         proxmox_node=proxmox_node,
-        content=content
+        content=content,
+        block=block
     )
 
 
+@storages.command("fetch")
+def storages_fetch(
+    url: Annotated[str, typer.Option()],
+    storage: Annotated[str, typer.Option()],
+    content: Annotated[str, typer.Option()] = "iso",
+    filename: Annotated[str, typer.Option()] = None,
+    proxmox_nodes: Annotated[str, typer.Option()] = "",
+    checksum: Annotated[str, typer.Option()] = None,
+    checksum_algorithm: Annotated[str, typer.Option()] = None,
+    block: Annotated[bool, typer.Option()] = True,
+    timeout: Annotated[int, typer.Option()] = None
+):
+    """make the nodes download an image from an url into their storage"""
+    summary = p.storages_fetch(
+        url=url,
+        storage=storage,
+        content=content,
+        filename=filename,
+        proxmox_nodes=proxmox_nodes,
+        checksum=checksum,
+        checksum_algorithm=checksum_algorithm,
+        block=block,
+        timeout=timeout
+    )
+    for key, color in (
+        ("succeeded", "green"),
+        ("skipped", "blue"),
+        ("failed", "red"),
+        ("timeout", "yellow")
+    ):
+        for entry in summary[key]:
+            rprint(f"[{color}]{entry['node']}: {key} "
+                   f"({entry['reason']})[/{color}]")
+    if summary["failed"] or summary["timeout"]:
+        raise typer.Exit(code=1)
+
+
 @storages_content.command("list")
 def storages_content_list(
     storage: Annotated[str, typer.Option()],
@@ -662,7 +958,8 @@ def storages_content_list(
     output_format: Annotated[str, typer.Option()] = "table",
     content_type: Annotated[str, typer.Option()] = "",
     content_format: Annotated[str, typer.Option()] = "",
-    filter_orphaned: Annotated[str, typer.Option()] = "YES,NO,N/A"
+    filter_orphaned: Annotated[str, typer.Option()] = "YES,NO,N/A",
+    vmid: Annotated[int, typer.Option()] = None
 ):
     """list storage content"""
     p.get_storage_content(
@@ -671,6 +968,26 @@ def storages_content_list(
         content_type=content_type,
         content_format=content_format,
         output_format=output_format,
+        filter_orphaned=filter_orphaned,
+        vmid=vmid
+    )
+
+
+@storages_content.command("scan")
+def storages_content_scan(
+    proxmox_nodes: Annotated[str, typer.Option()] = "",
+    output_format: Annotated[str, typer.Option()] = "table",
+    content_type: Annotated[str, typer.Option()] = "",
+    content_format: Annotated[str, typer.Option()] = "",
+    filter_orphaned: Annotated[str, typer.Option()] = "YES"
+):
+    """scan the content of every node storage, orphaned volumes by default
+    shared storages are listed once"""
+    p.scan_storage_content(
+        proxmox_nodes=proxmox_nodes,
+        content_type=content_type,
+        content_format=content_format,
+        output_format=output_format,
         filter_orphaned=filter_orphaned
     )
 
@@ -681,15 +998,19 @@ def storages_content_clean_orphaned(
     proxmox_node: Annotated[str, typer.Option()],
     confirm: Annotated[bool, typer.Option()] = True,
     content_type: Annotated[str, typer.Option()] = "",
-    content_format: Annotated[str, typer.Option()] = ""
+    content_format: Annotated[str, typer.Option()] = "",
+    workers: Annotated[int, typer.Option()] = None,
+    timeout: Annotated[int, typer.Option()] = None
 ):
-    """list storage content"""
+    """delete orphaned volumes of a storage"""
     p.clean_orphaned_storage_content(
         proxmox_node=proxmox_node,
         storage=storage,
         confirm=confirm,
         content_type=content_type,
         content_format=content_format,
+        workers=workers,
+        timeout=timeout
     )
 
 
@@ -66,6 +66,16 @@ class ProxmoxVmMigrateFailedException(Exception):
         super().__init__(self.message)
 
 
+class ProxmoxVmCloneFailedException(Exception):
+    """raised when a clone task does not end successfully"""
+    def __init__(
+            self,
+            message="virtual machine clone failed"
+    ) -> None:
+        self.message = message
+        super().__init__(self.message)
+
+
 class ProxmoxVmNeedStopException(Exception):
     """raised when we an action on a vm need first to stop the vm"""
     def __init__(
@@ -94,3 +104,41 @@ class ProxmoxVmGetNetIfacesException(Exception):
     ) -> None:
         self.message = message
         super().__init__(self.message)
+
+
+class ProxmoxAsyncUnavailableException(Exception):
+    """raised when AsyncProxmox is used without aiohttp installed"""
+    def __init__(
+            self,
+            message="aiohttp is required, install proxcli[async]"
+    ) -> None:
+        self.message = message
+        super().__init__(self.message)
+
+
+class ProxmoxTasksFailedException(Exception):
+    """raised when some of the waited tasks failed or timed out"""
+    def __init__(
+            self,
+            tasks=None,
+            message="tasks failed"
+    ) -> None:
+        self.tasks = [] if tasks is None else tasks
+        self.message = message
+        if self.tasks:
+            self.message += ": " + ", ".join(
+                f"{t['type']} {t['id']} on {t['node']} ({t['exitstatus']})"
+                for t in self.tasks
+            )
+        super().__init__(self.message)
+
+
+class ProxmoxStorageVolumeExistsException(Exception):
+    """raised when a storage already holds a different file with the
+    same volume name"""
+    def __init__(
+            self,
+            message="a volume with the same name and another size exists"
+    ) -> None:
+        self.message = message
+        super().__init__(self.message)
@@ -1,12 +1,23 @@
 #!/usr/bin/env python
 """proxmoxlib module for managing promox cluster remotely"""
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import wait
 from datetime import datetime
+import copy
 import enum
+import hashlib
+import heapq
 import inspect
+import itertools
+import tempfile
+import threading
 import time
 from typing import Any
 from urllib import parse as urllib_parse
 import json
+import queue
+import random
 import re
 import os
 from dataclasses import dataclass
@@ -18,13 +29,52 @@ from beautifultable import BeautifulTable
 import urllib3
 from termcolor import colored
 from rich import print as rprint
+from rich.console import Console
+from rich.progress import BarColumn
+from rich.progress import DownloadColumn
+from rich.progress import Progress
+from rich.progress import TextColumn
+from rich.progress import TimeRemainingColumn
+from rich.progress import TransferSpeedColumn
+from requests_toolbelt import MultipartEncoder
+from requests_toolbelt import MultipartEncoderMonitor
 from proxmoxer import ResourceException
 from proxmoxer import ProxmoxAPI
+from proxmoxer.backends.https import ProxmoxHTTPAuth
+from proxmoxer.backends.https import ProxmoxHTTPAuthBase
 from proxmoxer.tools import Tasks
 import proxcli_exceptions
 
 urllib3.disable_warnings()
 
+# displayed in place of ip addresses when the guest agent did not answer
+IP_UNKNOWN = "unknown"
+CLUSTER_LOG_SEVERITIES = {
+    '0': "panic",
+    '1': "alert",
+    '2': "critical",
+    '3': "error",
+    '4': "warning",
+    '5': "notice",
+    '6': "info",
+    '7': "debug"
+}
+UPLOAD_CHECKSUM_ALGORITHM = "sha256"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+TASK_TIMEOUT = "timeout"
+WAIT_DELAY_MIN = 0.25
+WAIT_DELAY_MAX = 5
+WAIT_DELAY_FACTOR = 1.5
+TASKS_LIST_LIMIT = 1000
+WAVE_IDLE_POLLS = 3
+CLONE_VMID_ATTEMPTS = 3
+DISK_KEY_REGEX = r"^(ide|sata|scsi|virtio|efidisk|tpmstate)[0-9]+$"
+
+# proxmox authentication tickets are valid for two hours, cached tickets
+# are not reused during the last minutes of their life
+TICKET_LIFETIME = 7200
+TICKET_EXPIRY_MARGIN = 600
+
 
 @dataclass
 class VmProperties:
@@ -68,17 +118,230 @@ class HaResource:
     state: str
 
 
+@dataclass
+class VmIndex:
+    """vms list indexed for constant time lookups, read only
+
+    Variables:
+        by_vmid (dict): vmid (int) -> vm
+        by_name (dict): vm name -> list of vms sharing that name
+        by_node (dict): node name -> list of vms hosted on that node
+    """
+    by_vmid: dict
+    by_name: dict
+    by_node: dict
+
+
+class CachedTicketAuth(ProxmoxHTTPAuth):
+    """ProxmoxHTTPAuth restored from a cached ticket instead of a login
+
+    Args:
+        username (str): user the ticket was issued to
+        ticket (str): PVEAuthCookie value
+        csrf_prevention_token (str): CSRF token issued with the ticket
+        age (float): seconds elapsed since the ticket was issued
+        base_url (str): api base url
+    """
+    # pylint: disable=super-init-not-called,non-parent-init-called
+    def __init__(
+            self,
+            username,
+            ticket,
+            csrf_prevention_token,
+            age,
+            base_url="",
+            **kwargs
+    ):
+        ProxmoxHTTPAuthBase.__init__(self, **kwargs)
+        self.base_url = base_url
+        self.username = username
+        self.pve_auth_ticket = ticket
+        self.csrf_prevention_token = csrf_prevention_token
+        # proxmoxer renews the ticket once birth_time is renew_age old
+        self.birth_time = time.monotonic() - age
+
+
 class Proxmox():
     """proxmox api helper"""
     def __init__(self) -> None:
         result = self.load_config()
         self.host = ""
-        if result:
-            self.proxmox_instance = self.proxmox()
-
+        # command scoped memoization of inventory reads, see cached()
+        self.cache = {}
+        self.indexes = {}
+        self.cache_max_age = None
+        self.cache_refresh = False
+        self.cache_bypass = False
+        self.api_calls = 0
+        self.api_calls_avoided = 0
+        self.api_calls_lock = threading.Lock()
+        # the api connection is opened on first use, see proxmox_instance
+        self._proxmox_instance = None
+        self.saved_ticket = None
+        self.auth_lock = threading.Lock()
+        if not result:
+            self.cache_enabled = False
+
+    @property
+    def proxmox_instance(self) -> ProxmoxAPI:
+        """proxmox api instance, connected on first use"""
+        if self._proxmox_instance is None:
+            # the first call may come from several run_parallel workers,
+            # only one of them connects
+            with self.auth_lock:
+                if self._proxmox_instance is None:
+                    self._proxmox_instance = self.proxmox()
+        return self._proxmox_instance
+
+    @proxmox_instance.setter
+    def proxmox_instance(self, api) -> None:
+        self._proxmox_instance = api
 
     # UTILITY #
 
+    def count_api_call(self, response, *args, **kwargs):
+        """requests response hook counting api round trips"""
+        with self.api_calls_lock:
+            self.api_calls += 1
+        return response
+
+    def proxcli_path(self, name) -> str:
+        """path of a proxcli state file, parent directories are created"""
+        path = os.path.abspath(os.path.expanduser(f"~/.proxcli/{name}"))
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        return path
+
+    def set_cache_policy(self, max_age=None, refresh=False) -> None:
+        """
+        control the on disk cache freshness for this command
+
+            Parameters:
+                max_age (int): maximum entries age in seconds, overrides
+                               the per resource ttl and enables the cache
+                refresh (bool): ignore cached entries and fetch again
+        """
+        if max_age is not None:
+            self.cache_enabled = True
+            self.cache_max_age = max_age
+        self.cache_refresh = refresh
+
+    def bypass_disk_cache(self) -> None:
+        """
+        stop reading the on disk cache for the rest of this command
+        mutating methods resolve their targets from the live cluster,
+        entries already loaded from disk are dropped
+        """
+        if self.cache_enabled and not self.cache_bypass:
+            self.cache.clear()
+            self.indexes.clear()
+        self.cache_bypass = True
+
+    def cache_file(self, key) -> str:
+        """on disk cache file for a cache entry"""
+        return self.proxcli_path(f"cache/{key.replace(':', '_')}.json")
+
+    def disk_cache_load(self, key) -> Any:
+        """
+        load a cache entry from disk
+        return None when missing, expired or written for another cluster
+        """
+        if self.cache_refresh or self.cache_bypass:
+            return None
+        ttl = self.cache_ttl[key.split(":")[0]]
+        max_age = ttl if self.cache_max_age is None else self.cache_max_age
+        try:
+            with open(self.cache_file(key), "r", encoding="utf-8") as handle:
+                entry = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if (
+            entry.get("hosts") != self.hosts or
+            entry.get("user") != self.username or
+            time.time() - entry.get("time", 0) > max_age
+        ):
+            return None
+        return entry["data"], entry["cost"]
+
+    def disk_cache_save(self, key, data, cost) -> None:
+        """atomically write a cache entry to disk"""
+        path = self.cache_file(key)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as handle:
+            json.dump({
+                "hosts": self.hosts,
+                "user": self.username,
+                "time": time.time(),
+                "cost": cost,
+                "data": data
+            }, handle)
+        os.replace(f"{path}.tmp", path)
+
+    def cached(self, key, loader) -> Any:
+        """
+        memoize the result of loader under key
+
+        results are kept for the lifetime of the instance (a single cli
+        command) until a mutating method invalidates them. Each hit adds
+        the number of api calls the loader needed to api_calls_avoided.
+        When the on disk cache is enabled, entries are also shared between
+        commands until their ttl expires.
+
+            Parameters:
+                key (str): cache entry name (nodes, vms, ha_groups, ...)
+                loader (callable): function fetching the data
+            Returns:
+                a copy of the cached data, callers are free to mutate it
+        """
+        if key in self.cache:
+            data, cost = self.cache[key]
+            self.api_calls_avoided += cost
+            return copy.deepcopy(data)
+        persistent = (
+            self.cache_enabled and key.split(":")[0] in self.cache_ttl
+        )
+        entry = self.disk_cache_load(key) if persistent else None
+        if entry:
+            data, cost = entry
+            self.api_calls_avoided += cost
+        else:
+            calls = self.api_calls
+            data = loader()
+            cost = self.api_calls - calls
+            if persistent:
+                self.disk_cache_save(key, data, cost)
+        self.cache[key] = (copy.deepcopy(data), cost)
+        return data
+
+    def invalidate(self, *keys) -> None:
+        """
+        drop cache entries after a mutation
+        a key also drops its variants (vms drops vms:qemu,lxc)
+        """
+        for entry in list(self.cache):
+            if entry.split(":")[0] in keys:
+                del self.cache[entry]
+        for entry in list(self.indexes):
+            # ha resources index is joined with vm names
+            if entry.split(":")[0] in keys or (
+                entry == "ha_resources" and "vms" in keys
+            ):
+                del self.indexes[entry]
+        # entries on disk are dropped even when this command does not use
+        # the cache, a later command could still read them
+        cache_dir = os.path.dirname(self.cache_file("none"))
+        for file_name in os.listdir(cache_dir):
+            if any(
+                file_name == f"{key}.json" or file_name.startswith(f"{key}_")
+                for key in keys
+            ):
+                os.remove(os.path.join(cache_dir, file_name))
+
+    def get_api_stats(self) -> dict:
+        """api calls made and avoided by the cache for this instance"""
+        return {
+            "api_calls": self.api_calls,
+            "api_calls_avoided": self.api_calls_avoided
+        }
+
     def bytesto(self, bytes, to, bsize=1024):
         """convert bytes to megabytes, etc.
         sample code:
@@ -149,6 +412,45 @@ class Proxmox():
             self.table_style = self.get_table_style(config["data"]["style"])
             self.task_polling_interval = config["tasks"]["polling_interval"]
             self.task_timeout = config["tasks"]["timeout"]
+            self.probe_timeout = config.getfloat(
+                "connection", "probe_timeout", fallback=1)
+            self.node_timeout = config.getfloat(
+                "connection", "node_timeout", fallback=10)
+            self.agent_workers = config.getint(
+                "agent", "workers", fallback=16)
+            self.agent_timeout = config.getfloat(
+                "agent", "timeout", fallback=5)
+            self.power_workers = config.getint(
+                "power", "workers", fallback=8)
+            self.power_node_workers = config.getint(
+                "power", "node_workers", fallback=0)
+            # storage scans, volume deletes, config and tag writes and
+            # wave planning, power actions use the [power] section
+            self.concurrency_workers = config.getint(
+                "concurrency", "workers", fallback=8)
+            self.wave_size = config.getint("waves", "size", fallback=5)
+            self.wave_iowait = config.getfloat(
+                "waves", "iowait", fallback=0.1)
+            self.wave_timeout = config.getfloat(
+                "waves", "timeout", fallback=120)
+            self.clone_workers = {"workers": 2}
+            if config.has_section("clone"):
+                self.clone_workers.update({
+                    k: int(v) for k, v in config["clone"].items()
+                })
+            self.cache_enabled = config.getboolean(
+                "cache", "enabled", fallback=False)
+            self.cache_ttl = {
+                resource: config.getint("cache", resource, fallback=ttl)
+                for resource, ttl in (
+                    ("nodes", 60),
+                    ("vms", 15),
+                    ("ha_groups", 300),
+                    ("ha_resources", 60),
+                    ("storages", 300),
+                    ("storage_status", 30)
+                )
+            }
             self.table_colorize = dict(
                 [v.split(':') for v in config["data"]["colorize"].split(",")]
             )
@@ -156,26 +458,87 @@ class Proxmox():
         else:
             return False
 
+    def probe_host(self, host) -> float:
+        """
+        check that a proxmox host answers on its api port
+
+            Parameters:
+                host (str): hostname or ip address
+            Returns:
+                latency (float): response time in seconds
+            Raises:
+                requests.RequestException: host unreachable or unhealthy
+        """
+        start = time.monotonic()
+        response = requests.get(
+            f"https://{host}:8006",
+            timeout=self.probe_timeout,
+            allow_redirects=True,
+            verify=False
+        )
+        if response.status_code >= 500:
+            raise requests.RequestException(
+                f"{host} answered {response.status_code}")
+        return time.monotonic() - start
+
+    def save_active_node(self, host, latency) -> None:
+        """remember the selected host for the next run"""
+        with open(
+            self.proxcli_path("active_node.json"), "w", encoding="utf-8"
+        ) as handle:
+            json.dump(
+                {"host": host, "latency": latency, "time": time.time()},
+                handle
+            )
+
+    def load_active_node(self) -> Any:
+        """last known good host or None"""
+        try:
+            with open(
+                self.proxcli_path("active_node.json"), "r", encoding="utf-8"
+            ) as handle:
+                return json.load(handle).get("host")
+        except (OSError, ValueError):
+            return None
+
     def select_active_node(self) -> None:
         """
-        select the first available node
-        iterate over nodes, ping and set self.host property
+        select the fastest available node and set self.host property
+        the last known good host is tried first, then all the other hosts
+        are probed concurrently and the first healthy answer wins
         """
-        for host in self.hosts:
-            values = (host,)
-            url = f"https://{values[0]}:8006"
+        hosts = list(self.hosts)
+        last_host = self.load_active_node()
+        if last_host in hosts:
+            hosts.remove(last_host)
             try:
-                requests.get(
-                    url,
-                    timeout=1,
-                    allow_redirects=True,
-                    verify=False
-                )
-                self.host = host
-                break
-            finally:
+                latency = self.probe_host(last_host)
+                self.host = last_host
+                self.save_active_node(last_host, latency)
+                return
+            except Exception:  # pylint: disable=broad-except
                 pass
 
+        answers = queue.Queue()
+
+        def probe(host):
+            # every probe must answer, a silent thread would block get()
+            try:
+                answers.put((host, self.probe_host(host)))
+            except Exception:  # pylint: disable=broad-except
+                answers.put((host, None))
+
+        # daemon threads, unreachable hosts must not delay exit
+        for host in hosts:
+            threading.Thread(target=probe, args=(host,), daemon=True).start()
+        for _ in hosts:
+            host, latency = answers.get()
+            if latency is not None:
+                self.host = host
+                self.save_active_node(host, latency)
+                return
+        raise proxcli_exceptions.ProxmoxClusterDownException
+
     def get_table_style(self, style) -> enum.Enum:
         """set beautiful table display style from string"""
         if hasattr(BeautifulTable, style):
@@ -255,6 +618,73 @@ class Proxmox():
             table.rows.append(tuple(new_data_row))
         return table
 
+    def run_parallel(
+            self,
+            function,
+            items,
+            workers=8,
+            timeout=None
+    ) -> list:
+        """
+        run function on every item using a bounded thread pool
+
+            Parameters:
+                function (callable): called with a single item
+                items (list): items to process
+                workers (int): maximum number of concurrent calls
+                timeout (float): per call deadline in seconds, counted
+                                 from the moment the call starts
+            Returns:
+                list of (item, result, error) tuples in items order.
+                error is None on success, the raised exception on failure
+                or a TimeoutError when the call deadline elapsed
+        """
+        items = list(items)
+        if len(items) == 0:
+            return []
+        results = [None] * len(items)
+        started = {}
+
+        def call(index):
+            started[index] = time.monotonic()
+            return function(items[index])
+
+        executor = ThreadPoolExecutor(max_workers=min(workers, len(items)))
+        futures = {
+            executor.submit(call, index): index for index in range(len(items))
+        }
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(
+                    pending,
+                    timeout=0.1 if timeout else None,
+                    return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    index = futures[future]
+                    try:
+                        results[index] = (items[index], future.result(), None)
+                    except Exception as error:  # pylint: disable=broad-except
+                        results[index] = (items[index], None, error)
+                if not timeout:
+                    continue
+                now = time.monotonic()
+                for future in list(pending):
+                    index = futures[future]
+                    if index in started and now - started[index] > timeout:
+                        # abandon the call, its worker is released when
+                        # the underlying http request times out
+                        pending.discard(future)
+                        results[index] = (
+                            items[index],
+                            None,
+                            TimeoutError(f"no answer after {timeout}s")
+                        )
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return results
+
     def ismatching(self, regex, data) -> bool:
         """shortcut method used to check is a string match a regex"""
         if not re.match(regex, data):
@@ -281,71 +711,552 @@ class Proxmox():
                 https://proxmoxer.github.io/docs/2.0/tools/tasks/#blocking_status
         """
         print(f"Waiting for task {(task,)} to finish")
-        return Tasks.blocking_status(
-            prox=self.proxmox_instance,
-            task_id=task,
-            timeout=int(self.task_timeout),
-            polling_interval=float(self.task_polling_interval))
+        for status in self.iter_tasks([task]):
+            if status["exitstatus"] == TASK_TIMEOUT:
+                return None
+            return status
+        return None
+
+    def iter_tasks(self, upids, timeout=None) -> Any:
+        """
+        wait for many tasks, polling each node task list once per interval
+
+            Parameters:
+                upids (list): task identifiers, possibly on several nodes
+                timeout (float): overall deadline in seconds, the tasks
+                                 timeout setting when not specified
+            Yields:
+                task (dict): upid, node, type, id, user, status and
+                             exitstatus, in completion order. tasks still
+                             running at the deadline come last with
+                             exitstatus set to TASK_TIMEOUT
+        """
+        timeout = float(self.task_timeout) if timeout is None else timeout
+        pending = {upid: Tasks.decode_upid(upid) for upid in upids if upid}
+        deadline = time.monotonic() + timeout
+        while pending:
+            for node in sorted({t["node"] for t in pending.values()}):
+                node_pending = {
+                    u: t for u, t in pending.items() if t["node"] == node
+                }
+                for task in self.poll_node_tasks(node, node_pending):
+                    del pending[task["upid"]]
+                    yield task
+            if not pending:
+                return
+            if time.monotonic() >= deadline:
+                for task in pending.values():
+                    yield dict(task, status="running", exitstatus=TASK_TIMEOUT)
+                return
+            time.sleep(float(self.task_polling_interval))
+
+    def poll_node_tasks(self, node, pending) -> list:
+        """
+        finished tasks among pending (upid -> decoded upid), all on node
+        one task list request covers every pending task, tasks missing
+        from the list are asked individually. a node that can not be
+        reached gives no news for this poll, the caller deadline decides
+        """
+        node_api = self.proxmox_instance.nodes(node)
+        try:
+            listed = node_api.tasks.get(
+                source="all",
+                since=min(t["starttime"] for t in pending.values()),
+                limit=TASKS_LIST_LIMIT
+            )
+        except ResourceException:
+            listed = []
+        except requests.RequestException:
+            return []
+        listed = {t["upid"]: t for t in ([] if not listed else listed)}
+        finished = []
+        for upid, task in pending.items():
+            entry = listed.get(upid)
+            if entry is None:
+                try:
+                    entry = node_api.tasks(upid).status.get()
+                except (ResourceException, requests.RequestException):
+                    continue
+                if entry.get("status") != "stopped":
+                    continue
+                exitstatus = entry.get("exitstatus")
+            elif "endtime" not in entry:
+                continue
+            else:
+                exitstatus = entry.get("status")
+            finished.append(
+                dict(task, status="stopped", exitstatus=exitstatus)
+            )
+        return finished
+
+    def task_succeeded(self, task) -> bool:
+        """True when a finished task ended with OK or with warnings"""
+        exitstatus = str(task.get("exitstatus"))
+        return exitstatus == "OK" or exitstatus.startswith("WARNINGS")
+
+    def wait_tasks(self, upids, timeout=None, verbose=True) -> list:
+        """
+        block until all tasks are finished, see iter_tasks
+
+            Returns:
+                list of finished tasks in completion order
+            Raises:
+                ProxmoxTasksFailedException: some tasks failed or timed
+                out, all of them are listed in the exception
+        """
+        upids = [u for u in upids if u]
+        tasks = []
+        for task in self.iter_tasks(upids, timeout=timeout):
+            tasks.append(task)
+            if verbose:
+                rprint(
+                    f"[{len(tasks)}/{len(upids)}] {task['type']} "
+                    f"{task['id']} on {task['node']}: {task['exitstatus']}"
+                )
+        failed = [t for t in tasks if not self.task_succeeded(t)]
+        if failed:
+            raise proxcli_exceptions.ProxmoxTasksFailedException(failed)
+        return tasks
+
+    def load_ticket(self) -> Any:
+        """
+        cached authentication ticket for the configured user and hosts
+        return None when missing or about to expire
+        """
+        try:
+            with open(
+                self.proxcli_path("ticket.json"), "r", encoding="utf-8"
+            ) as handle:
+                ticket = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if (
+            ticket.get("user") != self.username or
+            ticket.get("hosts") != self.hosts or
+            time.time() - ticket.get("time", 0) >
+            TICKET_LIFETIME - TICKET_EXPIRY_MARGIN
+        ):
+            return None
+        return ticket
+
+    def save_ticket(self, auth) -> None:
+        """
+        persist the api ticket, readable by the current user only
+        response hooks of several workers may save it at once, each one
+        writes its own 0600 temporary file which atomically replaces
+        ticket.json
+        """
+        path = self.proxcli_path("ticket.json")
+        handle, temporary_path = tempfile.mkstemp(
+            dir=os.path.dirname(path),
+            prefix="ticket.",
+            suffix=".tmp"
+        )
+        with os.fdopen(handle, "w", encoding="utf-8") as file_handle:
+            json.dump({
+                "user": self.username,
+                "hosts": self.hosts,
+                "ticket": auth.pve_auth_ticket,
+                "csrf_prevention_token": auth.csrf_prevention_token,
+                "time": time.time() - (time.monotonic() - auth.birth_time)
+            }, file_handle)
+        os.replace(temporary_path, path)
+        self.saved_ticket = auth.pve_auth_ticket
+
+    def set_api_auth(self, api, auth) -> None:
+        """replace the authentication used by a proxmoxer api instance"""
+        # pylint: disable=protected-access
+        api._backend.auth = auth
+        api._store["session"].auth = auth
+
+    def track_ticket(self, response, *args, **kwargs):
+        """
+        requests response hook keeping the cached ticket up to date
+
+        tickets renewed by proxmoxer are persisted, a rejected ticket
+        triggers a single login with the configured password after which
+        the request is sent again
+        """
+        # pylint: disable=protected-access
+        api = self._proxmox_instance
+        if api is None:
+            return response
+        if response.status_code == 401 and not hasattr(
+            response.request, "relogin"
+        ):
+            auth = self.relogin(response.request)
+            request = response.request.copy()
+            request.relogin = True
+            request.headers.pop("Cookie", None)
+            request.prepare_cookies(auth.get_cookies())
+            if "CSRFPreventionToken" in request.headers:
+                request.headers[
+                    "CSRFPreventionToken"
+                ] = auth.csrf_prevention_token
+            # sent through the session so that the response hooks (api
+            # calls counter, ticket tracking) see the retry too
+            response = api._store["session"].send(request, **kwargs)
+        auth = api._backend.auth
+        if auth.pve_auth_ticket != self.saved_ticket:
+            self.save_ticket(auth)
+        return response
+
+    def relogin(self, request) -> ProxmoxHTTPAuth:
+        """
+        log in with the configured password after request was rejected
+        and return the new authentication, unless another worker already
+        logged in again since request was sent
+        """
+        # pylint: disable=protected-access
+        api = self._proxmox_instance
+        with self.auth_lock:
+            auth = api._backend.auth
+            if auth.pve_auth_ticket in request.headers.get("Cookie", ""):
+                auth = ProxmoxHTTPAuth(
+                    self.username,
+                    self.password,
+                    base_url=api._backend.get_base_url(),
+                    verify_ssl=False
+                )
+                self.set_api_auth(api, auth)
+        return auth
 
     def proxmox(self) -> ProxmoxAPI:
-        """create proxmox api instance from the first available node found"""
+        """
+        create proxmox api instance from the first available node found
+        a cached authentication ticket is reused instead of logging in
+        """
+        # pylint: disable=protected-access
         self.select_active_node()
-        return ProxmoxAPI(
-            self.host,
-            user=self.username,
-            password=self.password,
-            verify_ssl=False
+        ticket = self.load_ticket()
+        if ticket:
+            # token authentication does not log in, its auth is then
+            # replaced by the cached ticket
+            api = ProxmoxAPI(
+                self.host,
+                user=self.username,
+                token_name="ticket",
+                token_value="cached",
+                verify_ssl=False
+            )
+            self.set_api_auth(api, CachedTicketAuth(
+                self.username,
+                ticket["ticket"],
+                ticket["csrf_prevention_token"],
+                age=time.time() - ticket["time"],
+                base_url=api._backend.get_base_url(),
+                verify_ssl=False
+            ))
+            self.saved_ticket = ticket["ticket"]
+        else:
+            api = ProxmoxAPI(
+                self.host,
+                user=self.username,
+                password=self.password,
+                verify_ssl=False
+            )
+            self.save_ticket(api._backend.auth)
+        # count api calls, persist renewed tickets and size the connection
+        # pool for concurrent api calls
+        api._store["session"].hooks["response"].append(self.count_api_call)
+        api._store["session"].hooks["response"].append(self.track_ticket)
+        api._store["session"].mount(
+            "https://",
+            requests.adapters.HTTPAdapter(
+                pool_maxsize=max(10, self.agent_workers)
+            )
         )
+        return api
 
     # STORAGE #
 
-    def get_storages(self, output_format="json") -> Any:
-        """list storages"""
-        # nodes = self.get_nodes(format="internal")
-        # nodes = [] if not nodes else nodes
-        # available_nodes = [n for n in nodes if n["status"] == "online"]
-        # if len(available_nodes) > 0:
-        #     query_node = available_nodes[0]
-        # else:
-        #     raise ProxmoxClusterDownException
-
-        all_storages = []
+    def get_storages(
+            self,
+            output_format="json",
+            proxmox_nodes=None,
+            sort_by="storage",
+            reverse=False,
+            min_used=None
+    ) -> Any:
+        """
+        list storages with their capacity on each node
 
-        storages = self.proxmox_instance.storage.get()
-        storages = [] if not storages else storages
-        for storage in storages:
-            all_storages.append(storage)
+            Parameters:
+                output_format (str): internal, json, yaml or table
+                proxmox_nodes (str): coma separated list of nodes
+                sort_by (str): record key used to sort storages
+                reverse (bool): sort in descending order
+                min_used (float): only storages at least this full (0-1)
+            Returns:
+                one record per node and storage with total, used, avail
+                and used_fraction, read from a single api call
+        """
+        resources = self.cached(
+            "storage_status",
+            lambda: self.get_cluster_resources(resource_type="storage")
+        )
+        storages = [self.storage_record(r) for r in resources]
+        if proxmox_nodes:
+            proxmox_nodes = proxmox_nodes.split(",")
+            storages = [s for s in storages if s["node"] in proxmox_nodes]
+        if min_used is not None:
+            storages = [
+                s for s in storages if s["used_fraction"] >= float(min_used)
+            ]
+        storages = sorted(
+            storages,
+            key=lambda s: (s.get(sort_by) is None, s.get(sort_by), s["node"]),
+            reverse=reverse
+        )
         return self.output(
             headers=self.headers_storage,
-            data=all_storages,
+            data=storages,
             output_format=output_format
         )
 
+    def storage_record(self, resource) -> dict:
+        """node storage capacity record from a cluster storage resource"""
+        total = int(resource.get("maxdisk", 0) or 0)
+        used = int(resource.get("disk", 0) or 0)
+        return {
+            "storage": resource["storage"],
+            "node": resource["node"],
+            "content": resource.get("content", ""),
+            "type": resource.get("plugintype", ""),
+            "active": 1 if resource.get("status") == "available" else 0,
+            "enabled": 0 if resource.get("status") == "disabled" else 1,
+            "shared": int(resource.get("shared", 0) or 0),
+            "total": total,
+            "used": used,
+            "avail": max(total - used, 0),
+            "used_fraction": round(used / total, 4) if total else 0.0
+        }
+
     def storages_upload(
         self,
         file,
         proxmox_node,
         storage,
-        content
-    ) -> None:
-        """upload image or iso file to proxmox node"""
-        with open(str(file), 'rb') as file_handler:
-            storage = self.proxmox_instance.nodes(proxmox_node).storage(
-                storage
+        content,
+        block=True
+    ) -> Any:
+        """
+        upload image or iso file to proxmox node
+
+        the file is streamed as a multipart body in fixed size chunks, so
+        memory use does not depend on its size. its sha256 checksum is
+        sent along and verified by the node
+
+            Parameters:
+                file (str): path of the file to upload
+                proxmox_node (str): node receiving the file
+                storage (str): target storage
+                content (str): iso, vztmpl or import
+                block (bool): wait for the node to verify and store it
+            Returns:
+                the upload task identifier
+        """
+        # pylint: disable=protected-access
+        path = str(file)
+        size = os.path.getsize(path)
+        checksum = self.file_checksum(path)
+        session = self.proxmox_instance._store["session"]
+        url = (
+            f"{self.proxmox_instance._store['base_url']}/nodes/"
+            f"{proxmox_node}/storage/{storage}/upload"
+        )
+        # a streamed body can not be sent again by track_ticket, a
+        # rejected ticket is renewed here and the file streamed once more
+        for attempt in range(2):
+            with open(path, 'rb') as file_handler, Progress(
+                TextColumn("{task.description}"),
+                BarColumn(),
+                DownloadColumn(),
+                TransferSpeedColumn(),
+                TimeRemainingColumn()
+            ) as progress:
+                upload = progress.add_task(
+                    os.path.basename(path),
+                    total=size
+                )
+                encoder = MultipartEncoder(fields={
+                    "content": content,
+                    "checksum": checksum,
+                    "checksum-algorithm": UPLOAD_CHECKSUM_ALGORITHM,
+                    "filename": (os.path.basename(path), file_handler)
+                })
+                monitor = MultipartEncoderMonitor(
+                    encoder,
+                    lambda m: progress.update(
+                        upload,
+                        completed=min(m.bytes_read, size)
+                    )
+                )
+                # the session adds the ticket, the csrf token and the
+                # response hooks (api calls counter, ticket tracking)
+                request = session.prepare_request(requests.Request(
+                    "POST",
+                    url,
+                    data=monitor,
+                    headers={"Content-Type": monitor.content_type},
+                    cookies=session.auth.get_cookies()
+                ))
+                request.relogin = True
+                response = session.send(request, verify=False, timeout=None)
+            if response.status_code != 401 or attempt:
+                break
+            self.relogin(request)
+        if response.status_code >= 400:
+            raise ResourceException(
+                response.status_code,
+                response.reason,
+                response.text
+            )
+        upid = response.json().get("data")
+        if block and upid:
+            self.wait_tasks([upid])
+        return upid
+
+    def file_checksum(self, path) -> str:
+        """hex digest of a file read in UPLOAD_CHUNK_SIZE chunks"""
+        digest = hashlib.new(UPLOAD_CHECKSUM_ALGORITHM)
+        with open(path, 'rb') as file_handler:
+            for chunk in iter(
+                lambda: file_handler.read(UPLOAD_CHUNK_SIZE), b""
+            ):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def storages_fetch(
+        self,
+        url,
+        storage,
+        content="iso",
+        filename=None,
+        proxmox_nodes=None,
+        checksum=None,
+        checksum_algorithm=None,
+        block=True,
+        timeout=None
+    ) -> dict:
+        """
+        make nodes download a file into their storage
+
+        every node holding the storage pulls the url itself through the
+        download-url api, concurrently. nodes whose storage already holds
+        the same volume name and size are skipped, a shared storage is
+        downloaded by a single node
+
+            Parameters:
+                url (str): http(s) url of the file
+                storage (str): target storage
+                content (str): iso, vztmpl or import
+                filename (str): volume file name, from the url by default
+                proxmox_nodes (str): coma separated list of nodes
+                checksum (str): expected checksum of the file
+                checksum_algorithm (str): md5, sha1, sha256 ...
+                block (bool): wait for the download tasks
+                timeout (float): overall wait deadline in seconds
+            Returns:
+                summary dict with succeeded, failed, timeout and skipped
+                lists of {node, reason} entries
+        """
+        self.bypass_disk_cache()
+        filename = filename or os.path.basename(
+            urllib_parse.urlparse(url).path
+        )
+        volid = f"{storage}:{content}/{filename}"
+        targets = [
+            r for r in self.get_cluster_resources(resource_type="storage")
+            if r["storage"] == storage and r.get("status") == "available"
+            and (not proxmox_nodes or r["node"] in proxmox_nodes.split(","))
+        ]
+        summary = {"succeeded": [], "failed": [], "timeout": [], "skipped": []}
+        if not targets:
+            return summary
+        shared = [r for r in targets if r.get("shared")]
+        for resource in shared[1:]:
+            summary["skipped"].append(
+                {"node": resource["node"], "reason": "shared storage"})
+        targets = shared[:1] if shared else targets
+        # the remote size only tells existing volumes apart, an url the
+        # node can not query (unreachable, HEAD rejected) is still fetched
+        [(_, metadata, error)] = self.run_parallel(
+            lambda node: self.proxmox_instance.nodes(node)(
+                "query-url-metadata").get(url=url),
+            [targets[0]["node"]],
+            timeout=self.node_timeout
+        )
+        if error:
+            Console(stderr=True).print(
+                f"[yellow]{url} metadata unavailable: {error}[/yellow]"
+            )
+        size = (metadata or {}).get("size")
+
+        def fetch(resource):
+            existing = [
+                v for v in self.fetch_storage_content(
+                    resource["node"],
+                    storage,
+                    content_type=content
+                ) if v["volid"] == volid
+            ]
+            if existing:
+                if size is not None and int(existing[0]["size"]) != int(
+                    size
+                ):
+                    raise (
+                        proxcli_exceptions.ProxmoxStorageVolumeExistsException
+                    )
+                return None
+            api = self.proxmox_instance.nodes(resource["node"]).storage(
+                storage)
+            return api("download-url").post(
+                url=url,
+                content=content,
+                filename=filename,
+                checksum=checksum,
+                **{"checksum-algorithm": checksum_algorithm}
             )
-            storage.upload.post(content=content, filename=file_handler)
+
+        upids = {}
+        for resource, upid, error in self.run_parallel(
+            fetch, targets, workers=max(1, len(targets))
+        ):
+            if error:
+                summary["failed"].append(
+                    {"node": resource["node"], "reason": str(error)})
+            elif upid is None:
+                summary["skipped"].append(
+                    {"node": resource["node"], "reason": f"{volid} present"})
+            elif block:
+                upids[upid] = resource["node"]
+            else:
+                summary["succeeded"].append(
+                    {"node": resource["node"], "reason": upid})
+        for task in self.iter_tasks(list(upids), timeout=timeout):
+            entry = {"node": upids[task["upid"]], "reason": task["exitstatus"]}
+            if task["exitstatus"] == TASK_TIMEOUT:
+                summary["timeout"].append(entry)
+            elif self.task_succeeded(task):
+                summary["succeeded"].append(entry)
+            else:
+                summary["failed"].append(entry)
+        self.invalidate("storages", "storage_status")
+        return summary
 
     def set_orphaned_storage_volumes_flag(
         self,
-        volumes
+        volumes,
+        vmids=None
     ) -> Any:
         """add a flag orphaned to volumes storage list"""
-        virtual_machines = self.get_vms(output_format="internal")
-        vmids = [v["vmid"] for v in virtual_machines]
+        if vmids is None:
+            vmids = set(self.get_vms_index(("qemu", "lxc")).by_vmid)
 
         for volume in volumes:
             if "vmid" in volume:
-                if volume["vmid"] not in vmids:
+                if int(volume["vmid"]) not in vmids:
                     volume["orphaned"] = "YES"
                 else:
                     volume["orphaned"] = "NO"
@@ -362,16 +1273,69 @@ class Proxmox():
         headers="",
         content_type="",
         content_format="",
-        filter_orphaned="YES,NO,N/A"
+        filter_orphaned="YES,NO,N/A",
+        vmid=None
     ) -> Any:
-        """get storage content list"""
+        """get storage content list, content types and vmid are filtered
+        by the api"""
         headers = self.headers_storage_content if (
             not headers or headers == "") else headers
+        results = self.fetch_storage_content(
+            proxmox_node,
+            storage,
+            content_type=content_type,
+            vmid=vmid
+        )
+        results = self.filter_storage_content(
+            results,
+            content_type=content_type,
+            content_format=content_format,
+            filter_orphaned=filter_orphaned
+        )
+        headers = [] if not headers or len(headers) == 0 else headers
+        return self.output(
+            headers=headers,
+            data=results,
+            output_format=output_format
+        )
+
+    def fetch_storage_content(
+        self,
+        proxmox_node,
+        storage,
+        content_type="",
+        vmid=None
+    ) -> list:
+        """
+        storage content filtered by the api on content type and vmid
+        the api takes a single content type, several types are fetched
+        concurrently
+        """
+        api = self.proxmox_instance.nodes(proxmox_node).storage(storage)
+        contents = [c for c in content_type.split(",") if c] or [None]
         results = []
+        for _, volumes, error in self.run_parallel(
+            lambda content: api.content.get(content=content, vmid=vmid),
+            contents,
+            workers=len(contents)
+        ):
+            if error:
+                raise error
+            results += [] if not volumes else volumes
+        return results
+
+    def filter_storage_content(
+        self,
+        results,
+        content_type="",
+        content_format="",
+        filter_orphaned="YES,NO,N/A",
+        vmids=None
+    ) -> list:
+        """filter a storage content list and flag orphaned volumes"""
+        results = [] if not results else results
         formats = content_format.split(",") if len(content_format) > 0 else []
         contents = content_type.split(",") if len(content_type) > 0 else []
-        results = self.proxmox_instance.nodes(
-            proxmox_node).storage(storage).content.get()
         # filter by content and format if needed
         if len(formats) > 0:
             results = [result for result in results if (
@@ -381,28 +1345,122 @@ class Proxmox():
             results = [result for result in results if (
                 result["content"] in contents
             )]
-        results = self.set_orphaned_storage_volumes_flag(results)
+        results = self.set_orphaned_storage_volumes_flag(results, vmids)
         # filter desired orphaned status
         filter_orphaned = filter_orphaned.split(",")
-        results = [volume for volume in results if (
+        return [volume for volume in results if (
             volume["orphaned"] in filter_orphaned
         )]
-        headers = [] if not headers or len(headers) == 0 else headers
+
+    def scan_storage_content(
+        self,
+        output_format="table",
+        content_type="",
+        content_format="",
+        filter_orphaned="YES",
+        proxmox_nodes=None
+    ) -> Any:
+        """
+        list the content of every node storage concurrently
+
+        storages come from /cluster/resources, shared storages are listed
+        once through one of their available nodes. the existing guests
+        vmids (qemu and lxc) are read once for the whole scan
+
+            Parameters:
+                output_format (str): internal, json, yaml or table
+                content_type (str): coma separated content types
+                content_format (str): coma separated volume formats
+                filter_orphaned (str): coma separated YES, NO, N/A
+                proxmox_nodes (str): coma separated list of nodes
+            Returns:
+                volumes with their node and storage, the orphaned volumes
+                count and reclaimable size per storage are reported on
+                stderr
+        """
+        pairs = self.get_storage_pairs(proxmox_nodes)
+        vmids = set(self.get_vms_index(("qemu", "lxc")).by_vmid)
+        volumes = []
+        failed = []
+        for (node, storage), content, error in self.run_parallel(
+            lambda pair: self.proxmox_instance.nodes(pair[0]).storage(
+                pair[1]).content.get(),
+            pairs,
+            workers=max(1, min(len(pairs), self.concurrency_workers)),
+            timeout=self.node_timeout
+        ):
+            if error:
+                failed.append((f"{node}/{storage}", error))
+                continue
+            for volume in self.filter_storage_content(
+                content,
+                content_type=content_type,
+                content_format=content_format,
+                filter_orphaned=filter_orphaned,
+                vmids=vmids
+            ):
+                volume["node"] = node
+                volume["storage"] = storage
+                volumes.append(volume)
+        self.report_failed_nodes("storage content", failed)
+        orphaned = {}
+        for volume in volumes:
+            if volume["orphaned"] == "YES":
+                total = orphaned.setdefault(volume["storage"], [0, 0])
+                total[0] += 1
+                total[1] += int(volume.get("size", 0))
+        # on stderr, json and yaml outputs are kept parsable
+        console = Console(stderr=True)
+        for storage, (count, size) in sorted(orphaned.items()):
+            console.print(
+                f"{storage}: {count} orphaned volume(s), "
+                f"{self.bytesto(size, 'G'):.2f} GiB reclaimable"
+            )
         return self.output(
-            headers=headers,
-            data=results,
+            headers=["node", "storage"] + self.headers_storage_content,
+            data=volumes,
             output_format=output_format
         )
 
+    def get_storage_pairs(self, proxmox_nodes=None) -> list:
+        """
+        (node, storage) pairs of the available storages, one pair per
+        shared storage
+        """
+        proxmox_nodes = (
+            proxmox_nodes.split(",") if proxmox_nodes else None
+        )
+        pairs = {}
+        for resource in self.get_cluster_resources(resource_type="storage"):
+            if resource.get("status") != "available":
+                continue
+            if proxmox_nodes and resource["node"] not in proxmox_nodes:
+                continue
+            key = resource["storage"] if resource.get("shared") else (
+                resource["node"], resource["storage"]
+            )
+            pairs.setdefault(key, (resource["node"], resource["storage"]))
+        return sorted(pairs.values())
+
     def clean_orphaned_storage_content(
       self,
       proxmox_node,
       storage,
       content_type,
       content_format,
-      confirm=True
-    ):
-        """ clean orphaned volumes in node storage """
+      confirm=True,
+      workers=None,
+      timeout=None
+    ) -> dict:
+        """
+        clean orphaned volumes in node storage
+        volumes are confirmed first, then deleted with bounded concurrency
+        and their tasks waited for together
+
+            Returns:
+                freed bytes per storage
+        """
+        self.bypass_disk_cache()
         orphaned = self.get_storage_content(
             proxmox_node=proxmox_node,
             storage=storage,
@@ -411,23 +1469,72 @@ class Proxmox():
             content_type=content_type,
             content_format=content_format
         )
-        delete_volume = False
-        for o in orphaned:
-            if confirm:
-                response = input((
-                    f"Do you realy want to delete "
-                    f"volume {o['volid']} ?"
-                ))
-                if response:
-                    delete_volume = True
-                else:
-                    delete_volume = False
+        if confirm:
+            orphaned = [o for o in orphaned if input((
+                f"Do you realy want to delete "
+                f"volume {o['volid']} ? [y/N] "
+            )).strip().lower() in ("y", "yes")]
+        return self.delete_storage_volumes(
+            proxmox_node,
+            storage,
+            orphaned,
+            workers=workers,
+            timeout=timeout
+        )
+
+    def delete_storage_volumes(
+        self,
+        proxmox_node,
+        storage,
+        volumes,
+        workers=None,
+        timeout=None
+    ) -> dict:
+        """
+        delete storage volumes concurrently and wait for their tasks
+        progress and failures are reported on stderr
+
+            Returns:
+                freed bytes per storage
+        """
+        api = self.proxmox_instance.nodes(proxmox_node).storage(storage)
+        console = Console(stderr=True)
+
+        def delete(volume):
+            console.print(f"delete {volume['volid']}")
+            return api.content(volume["volid"]).delete()
+
+        freed = {}
+        failed = []
+        upids = {}
+        for volume, upid, error in self.run_parallel(
+            delete,
+            volumes,
+            workers=self.concurrency_workers if workers is None else workers
+        ):
+            if error:
+                failed.append((volume, error))
+            elif upid:
+                upids[upid] = volume
             else:
-                delete_volume = True
-            if delete_volume:
-                print(f"delete {o['volid']}")
-                self.proxmox_instance.nodes(proxmox_node).storage(
-                    storage).content(o["volid"]).delete()
+                freed[storage] = freed.get(storage, 0) + int(
+                    volume.get("size", 0))
+        for task in self.iter_tasks(list(upids), timeout=timeout):
+            volume = upids[task["upid"]]
+            if self.task_succeeded(task):
+                freed[storage] = freed.get(storage, 0) + int(
+                    volume.get("size", 0))
+            else:
+                failed.append((volume, task["exitstatus"]))
+        if freed:
+            self.invalidate("storage_status")
+        for volume, error in failed:
+            console.print(
+                f"[red]delete {volume['volid']} failed: {error}[/red]"
+            )
+        for name, size in sorted(freed.items()):
+            console.print(f"{name}: {self.bytesto(size, 'G'):.2f} GiB freed")
+        return freed
 
     # CLUSTER #
 
@@ -471,33 +1578,12 @@ class Proxmox():
             format (str, optional): _description_. Defaults to "internal".
             max (int, optional): _description_. Defaults to 100.
         """
-
-        translate_severity = {
-            '0': "panic",
-            '1': "alert",
-            '2': "critical",
-            '3': "error",
-            '4': "warning",
-            '5': "notice",
-            '6': "info",
-            '7': "debug"
-        }
         logs = self.proxmox_instance.cluster.log.get(**{'max': max_items})
-        if not logs:
-            logs = []
-        proxmox_nodes = [n.strip() for n in proxmox_nodes.split(",")]
-        severities = [s.strip() for s in severities.split(",")]
-        filtered_logs = []
-        for log in logs:
-            log["severity"] = translate_severity[str(log["pri"])]
-            log["date"] = self.readable_date(log["time"])
-            if log["severity"] in severities:
-                if len(proxmox_nodes) == 0:
-                    filtered_logs.append(log)
-                else:
-                    if log["node"] in proxmox_nodes:
-                        filtered_logs.append(log)
-
+        filtered_logs = self.filter_cluster_log(
+            logs,
+            proxmox_nodes=proxmox_nodes,
+            severities=severities
+        )
         if len(filtered_logs) == 0:
             return
 
@@ -507,26 +1593,111 @@ class Proxmox():
             output_format=output_format
         )
 
-    def get_ha_groups(
-            self,
-            output_format="internal",
-            filter_group="^.*"
-    ) -> Any:
-        """list cluster ha groups"""
-        hagroups = self.proxmox_instance.cluster.ha.groups.get()
-        hagroups = [
-            hag for hag in hagroups if re.match(
-                pattern=filter_group,
-                string=hag["group"]
-            )
+    def filter_cluster_log(self, logs, proxmox_nodes, severities) -> list:
+        """filter log entries then add their severity names and dates"""
+        keep = self.cluster_log_matcher(proxmox_nodes, severities)
+        return [
+            self.format_cluster_log(log) for log in ([] if not logs else logs)
+            if keep(log)
         ]
-        return self.output(
-            headers=self.headers_ha_groups,
-            data=hagroups,
-            output_format=output_format
-        )
 
-    def exists_ha_group(self, ha_group):
+    def cluster_log_matcher(self, proxmox_nodes, severities) -> Any:
+        """
+        predicate selecting log entries by node and severity names
+        the coma separated filters are turned into sets once
+        """
+        proxmox_nodes = {
+            n.strip() for n in (proxmox_nodes or "").split(",") if n.strip()
+        }
+        priorities = {
+            pri for pri, name in CLUSTER_LOG_SEVERITIES.items()
+            if name in {s.strip() for s in (severities or "").split(",")}
+        }
+
+        def keep(log):
+            return str(log["pri"]) in priorities and (
+                not proxmox_nodes or log["node"] in proxmox_nodes
+            )
+        return keep
+
+    def format_cluster_log(self, log) -> dict:
+        """add severity name and readable date to a log entry"""
+        log["severity"] = CLUSTER_LOG_SEVERITIES[str(log["pri"])]
+        log["date"] = self.readable_date(log["time"])
+        return log
+
+    def follow_cluster_log(
+            self,
+            proxmox_nodes,
+            severities,
+            interval=2,
+            max_items=100,
+            max_window=5000
+    ) -> Any:
+        """
+        stream cluster log entries, oldest first, as they are written
+
+        each poll asks for the max_items newest entries and drops the ones
+        already returned by the previous poll. when none of them overlaps
+        the previous poll, a burst happened and the window is doubled (up
+        to max_window) so no entry is missed
+
+            Yields:
+                log entry dicts with severity and date keys
+        """
+        keep = self.cluster_log_matcher(proxmox_nodes, severities)
+        seen = None
+        while True:
+            window = max_items
+            while True:
+                logs = self.proxmox_instance.cluster.log.get(max=window)
+                logs = [] if not logs else logs
+                keys = [self.cluster_log_key(log) for log in logs]
+                if (
+                    seen is None
+                    or not seen.isdisjoint(keys)
+                    or len(logs) < window
+                    or window >= max_window
+                ):
+                    break
+                window = min(window * 2, max_window)
+            fresh = [
+                log for log, key in zip(logs, keys)
+                if (seen is None or key not in seen) and keep(log)
+            ]
+            seen = set(keys)
+            for log in reversed(fresh):
+                yield self.format_cluster_log(log)
+            time.sleep(interval)
+
+    def cluster_log_key(self, log) -> tuple:
+        """identity of a cluster log entry"""
+        return (log.get("uid"), log.get("node"), log.get("time"))
+
+    def get_ha_groups(
+            self,
+            output_format="internal",
+            filter_group="^.*"
+    ) -> Any:
+        """list cluster ha groups"""
+        hagroups = self.cached(
+            "ha_groups",
+            lambda: self.proxmox_instance.cluster.ha.groups.get()
+        )
+        hagroups = [] if not hagroups else hagroups
+        hagroups = [
+            hag for hag in hagroups if re.match(
+                pattern=filter_group,
+                string=hag["group"]
+            )
+        ]
+        return self.output(
+            headers=self.headers_ha_groups,
+            data=hagroups,
+            output_format=output_format
+        )
+
+    def exists_ha_group(self, ha_group):
         """check if ha group exist"""
         ha_groups = self.get_ha_groups(output_format="internal")
         ha_groups = [h for h in ha_groups if h["group"] == ha_group]
@@ -559,6 +1730,7 @@ class Proxmox():
             "nofailback": nofailback,
             "restricted": restricted
         })
+        self.invalidate("ha_groups")
 
     def update_ha_group(
         self,
@@ -581,6 +1753,7 @@ class Proxmox():
         desired = {k: v for k, v in desired.items() if v is not None}
 
         self.proxmox_instance.cluster.ha.groups(group).put(**desired)
+        self.invalidate("ha_groups")
 
     def delete_ha_group(self, group) -> None:
         """delete cluster ha group
@@ -589,6 +1762,7 @@ class Proxmox():
             group (str): cluster ha group name to delete
         """
         self.proxmox_instance.cluster.ha.groups.delete(group)
+        self.invalidate("ha_groups")
 
     def get_ha_resources(
             self,
@@ -601,20 +1775,9 @@ class Proxmox():
         Returns:
             list: list of ha resources
         """
-        resources = self.proxmox_instance.cluster.ha.resources.get()
-        if not resources:
-            resources = []
-        vms = self.get_vms(output_format="internal", filter_name=filter_name)
-        for resource in resources:
-            vmid = resource["sid"].split(":")[-1]
-            virtual_machine = [v for v in vms if int(v["vmid"]) == int(vmid)]
-            if len(virtual_machine) > 0:
-                virtual_machine = virtual_machine[0]
-                resource["name"] = virtual_machine["name"]
-                resource["vmid"] = vmid
-            else:
-                resource["name"] = ""
-                resource["vmid"] = vmid
+        resources = copy.deepcopy(
+            list(self.get_ha_resources_index().values())
+        )
         resources = [r for r in resources if re.match(filter_name, r["name"])]
         if group:
             resources = [r for r in resources if r["group"] == group]
@@ -624,6 +1787,34 @@ class Proxmox():
             output_format=output_format
         )
 
+    def get_ha_resources_index(self) -> dict:
+        """
+        ha resources joined with their vm name and indexed by sid
+        built once per fetch, the returned dict must not be modified
+        """
+        if "ha_resources" not in self.indexes:
+            resources = self.cached(
+                "ha_resources",
+                lambda: self.proxmox_instance.cluster.ha.resources.get()
+            )
+            self.indexes["ha_resources"] = self.join_ha_resources(
+                resources,
+                self.get_vms_index()
+            )
+        return self.indexes["ha_resources"]
+
+    def join_ha_resources(self, resources, vms_index) -> dict:
+        """add vm names and vmids to ha resources and index them by sid"""
+        resources = [] if not resources else resources
+        for resource in resources:
+            vmid = resource["sid"].split(":")[-1]
+            virtual_machine = vms_index.by_vmid.get(int(vmid))
+            resource["name"] = (
+                virtual_machine["name"] if virtual_machine else ""
+            )
+            resource["vmid"] = vmid
+        return {r["sid"]: r for r in resources}
+
     def update_ha_resource(
         self,
         ha_resource: HaResource
@@ -639,6 +1830,7 @@ class Proxmox():
         self.proxmox_instance.cluster.ha.resources(
             ha_resource.sid
         ).put(**desired)
+        self.invalidate("ha_resources")
 
 
     def create_ha_resource(
@@ -653,12 +1845,13 @@ class Proxmox():
             state="started"
     ) -> None:
         """add a resource to ha group"""
+        self.bypass_disk_cache()
+        self.invalidate("ha_resources")
         if name and name != "":
-            vms = self.get_vms(
-                output_format="internal",
+            vms = self.filter_vms(
+                self.get_vms_snapshot(),
                 filter_name=name
             )
-            vms = [] if not vms else vms
             for virtual_machine in vms:
                 print(
                     (
@@ -688,8 +1881,8 @@ class Proxmox():
             return
 
         if filter_name and filter_name != "":
-            vms = self.get_vms(
-                output_format="internal",
+            vms = self.filter_vms(
+                self.get_vms_snapshot(),
                 filter_name=filter_name
             )
             for vm in vms:
@@ -709,9 +1902,7 @@ class Proxmox():
 
     def vm_ha_resource_managed(self, vmid):
         """checker if a vm is ha managed"""
-        resources = self.get_ha_resources(output_format="internal")
-        resources = [str(r["vmid"]) for r in resources]
-        return True if str(vmid) in resources else False
+        return self.get_resource_by_id_or_name(vmid=vmid) is not False
 
     def delete_ha_resources_by_group_name(
         self,
@@ -725,11 +1916,13 @@ class Proxmox():
         Returns:
             <variable>: Description of the return value
         """
+        self.bypass_disk_cache()
         resources = self.get_ha_resources(
             output_format="internal",
             filter_name="^.*"
         )
         resources = [r for r in resources if r["group"] == group]
+        self.invalidate("ha_resources")
         for resource in resources:
             print(f"Removing resource {(resource['vmid'],)}")
             ha_endpoint = self.proxmox_instance.cluster.ha
@@ -741,11 +1934,13 @@ class Proxmox():
             vmid=None
     ) -> None:
         """delete resource from ha group"""
+        self.bypass_disk_cache()
         if filter_name:
             resources = self.get_ha_resources(
                 output_format="internal",
                 filter_name=filter_name
             )
+            self.invalidate("ha_resources")
             for resource in resources:
                 if int(resource["vmid"]) > 0:
                     print(f"Removing resource {(resource['vmid'],)}")
@@ -755,6 +1950,7 @@ class Proxmox():
         if vmid > 0:
             print(f"Removing resource {(vmid,)}")
             self.proxmox_instance.cluster.ha.resources.delete(vmid)
+            self.invalidate("ha_resources")
             return
 
     def migrate_ha_resources(
@@ -766,6 +1962,7 @@ class Proxmox():
             block_max_try=3
     ) -> None:
         """migrate a resource from ha group"""
+        self.bypass_disk_cache()
         resources = []
         if filter_name and filter_name != "":
             resources = self.get_ha_resources(
@@ -786,6 +1983,7 @@ class Proxmox():
             ha_group = self.proxmox_instance.cluster.ha
             ha_group.resources(resource["vmid"]).migrate.post(
                 **{'node': proxmox_node})
+            self.invalidate("vms", "ha_resources")
             if block:
                 current_try = 0
                 current_node = "unknown"
@@ -796,6 +1994,7 @@ class Proxmox():
                     virtual_machine_status != "running" or
                     current_try < block_max_try
                 ):
+                    self.invalidate("vms")
                     resource = self.get_vm_by_id_or_name(
                         vmid=resource["vmid"]
                     )
@@ -808,15 +2007,19 @@ class Proxmox():
 
     def get_resource_by_id_or_name(self, vmid=None, resource_name=None) -> Any:
         """get resource by its id or name"""
-        resources = self.get_ha_resources(output_format="internal")
-        resources = [] if not resources else resources
+        resources = self.get_ha_resources_index()
         if vmid:
-            resource = [v for v in resources if v["vmid"] == int(vmid)]
+            resource = [
+                resources[sid] for sid in (f"vm:{vmid}", f"ct:{vmid}")
+                if sid in resources
+            ]
         else:
-            resource = [v for v in resources if v["name"] == resource_name]
+            resource = [
+                v for v in resources.values() if v["name"] == resource_name
+            ]
         if len(resource) == 0:
             return False
-        return resource[0]
+        return copy.deepcopy(resource[0])
 
     def relocate_ha_resources(
             self,
@@ -827,6 +2030,7 @@ class Proxmox():
             block_max_try=3
     ) -> None:
         """relocate ha resource"""
+        self.bypass_disk_cache()
         print((
             f"node {proxmox_node} "
             f"filter {filter_name} "
@@ -853,6 +2057,7 @@ class Proxmox():
             ha_group = self.proxmox_instance.cluster.ha
             ha_group.resources(resource["vmid"]).relocate.post(
                 **{'node': proxmox_node})
+            self.invalidate("vms", "ha_resources")
             if block:
                 current_try = 0
                 current_node = "unknown"
@@ -863,6 +2068,7 @@ class Proxmox():
                     virtual_machine_status != "running" or
                     current_try < block_max_try
                 ):
+                    self.invalidate("vms")
                     resource = self.get_vm_by_id_or_name(
                         vmid=resource["vmid"]
                     )
@@ -889,7 +2095,10 @@ class Proxmox():
                 TODO
 
         '''
-        proxmox_nodes = self.proxmox_instance.nodes.get()
+        proxmox_nodes = self.cached(
+            "nodes",
+            lambda: self.proxmox_instance.nodes.get()
+        )
         proxmox_nodes = [] if not proxmox_nodes else proxmox_nodes
         if filter_name:
             proxmox_nodes = [
@@ -904,97 +2113,310 @@ class Proxmox():
             output_format=output_format
         )
 
+    def select_online_nodes(self, nodes, proxmox_nodes=None) -> list:
+        """
+        names of the online nodes, restricted to the coma separated
+        proxmox_nodes list when given
+        """
+        available_nodes = [
+            n["node"] for n in nodes if n["status"] == "online"]
+        if not proxmox_nodes:
+            return available_nodes
+        proxmox_nodes = proxmox_nodes.split(",")
+        return [n for n in proxmox_nodes if n in available_nodes]
+
+    def format_tasks(self, node_tasks, limit=None) -> list:
+        """
+        merge per node task lists from newest to oldest, keep the limit
+        newest ones and make their dates human readable
+
+            Parameters:
+                node_tasks (list): one task list per node
+                limit (int): maximum number of tasks returned
+            Returns:
+                list of tasks
+        """
+        # nodes list running tasks first, order each stream by start time
+        streams = [
+            sorted(tasks, key=lambda t: t["starttime"], reverse=True)
+            for tasks in node_tasks if tasks
+        ]
+        tasks = [dict(t) for t in itertools.islice(
+            heapq.merge(
+                *streams, key=lambda t: t["starttime"], reverse=True
+            ),
+            limit
+        )]
+        for task in tasks:
+            task['starttime'] = self.readable_date(task['starttime'])
+            if 'endtime' in task:
+                task['endtime'] = self.readable_date(task['endtime'])
+            else:
+                task['endtime'] = ""
+        return tasks
+
     def get_tasks(
             self,
             output_format="internal",
             errors=0,
             limit=50,
             source="all",
-            proxmox_nodes=None
+            proxmox_nodes=None,
+            since=None,
+            until=None,
+            typefilter=None,
+            vmid=None,
+            statusfilter=None
     ) -> Any:
-        """get tasks from nodes"""
-        available_nodes = self.get_nodes(output_format="internal")
-        available_nodes = [
-            n["node"] for n in available_nodes if n["status"] == "online"]
-        if not proxmox_nodes:
-            proxmox_nodes = available_nodes
-        else:
-            proxmox_nodes = proxmox_nodes.split(",")
-            proxmox_nodes = [n for n in proxmox_nodes if n in available_nodes]
+        """
+        get the newest tasks of the cluster nodes
 
-        tasks = []
-        for node in proxmox_nodes:
-            node_tasks = self.proxmox_instance.nodes(node).tasks.get(**{
-                "errors": errors,
-                "limit": limit,
-                "source": source,
-                "vmid": None
-            })
-            node_tasks = [] if not node_tasks else node_tasks
-            tasks += node_tasks
-        tasks = [t for t in tasks if t["node"] in proxmox_nodes]
-        tasks = sorted(tasks, key=lambda d: d['starttime'], reverse=True)
-        for node_tasks in tasks:
-            node_tasks['starttime'] = self.readable_date(
-                node_tasks['starttime'])
-            if 'endtime' in node_tasks:
-                node_tasks['endtime'] = self.readable_date(
-                    node_tasks['endtime'])
-            else:
-                node_tasks['endtime'] = ""
-        self.output(
+            Parameters:
+                output_format (str): internal, json, yaml or table
+                errors (int): only tasks with errors when 1
+                limit (int): maximum number of tasks returned
+                source (str): archive, active or all
+                proxmox_nodes (str): coma separated list of nodes
+                since (int): only tasks started after this epoch
+                until (int): only tasks started before this epoch
+                typefilter (str): only tasks of this type (qmstart ...)
+                vmid (int): only tasks of this guest
+                statusfilter (str): coma separated list of task status
+            Returns:
+                dict with the tasks from newest to oldest under tasks and
+                the nodes that failed under failed_nodes, a table of the
+                tasks for table output
+        """
+        proxmox_nodes = self.select_online_nodes(
+            self.get_nodes(output_format="internal"),
+            proxmox_nodes
+        )
+        params = {
+            "errors": errors,
+            "limit": limit,
+            "source": source,
+            "since": since,
+            "until": until,
+            "typefilter": typefilter,
+            "vmid": vmid,
+            "statusfilter": statusfilter
+        }
+        params = {k: v for k, v in params.items() if v is not None}
+        node_tasks = []
+        failed = []
+        for node, tasks, error in self.run_parallel(
+            lambda node: self.proxmox_instance.nodes(node).tasks.get(
+                **params),
+            proxmox_nodes,
+            workers=max(1, len(proxmox_nodes)),
+            timeout=self.node_timeout
+        ):
+            if error:
+                failed.append((node, error))
+                continue
+            node_tasks.append([] if not tasks else tasks)
+        self.report_failed_nodes("tasks", failed)
+        tasks = self.format_tasks(node_tasks, limit)
+        if output_format != "table":
+            tasks = self.with_failed_nodes("tasks", tasks, failed)
+        return self.output(
             headers=self.headers_tasks,
             data=tasks,
             output_format=output_format
         )
 
+    def follow_tasks(
+            self,
+            proxmox_nodes=None,
+            interval=2,
+            limit=50,
+            **filters
+    ) -> Any:
+        """
+        stream the nodes tasks, the limit newest ones first then the new
+        ones and the end of the running ones as they happen
+
+        each node keeps a cursor on the newest start time seen and is only
+        asked for newer tasks. tasks shown as running are checked against
+        the small active tasks list of their node
+
+            Parameters:
+                proxmox_nodes (str): coma separated list of nodes
+                interval (float): seconds between two polls
+                limit (int): number of past tasks shown first per node
+                filters: typefilter, vmid, statusfilter ... api parameters
+            Yields:
+                (event, task): event is "new" or "finished", task the raw
+                api task (epoch dates, no endtime while running or when
+                the task status does not provide it)
+        """
+        proxmox_nodes = self.select_online_nodes(
+            self.get_nodes(output_format="internal"),
+            proxmox_nodes
+        )
+        filters = {k: v for k, v in filters.items() if v is not None}
+        cursors = {node: None for node in proxmox_nodes}
+        seen = {node: set() for node in proxmox_nodes}
+        running = {node: {} for node in proxmox_nodes}
+
+        def poll(node):
+            api = self.proxmox_instance.nodes(node)
+            params = dict(filters, source="all", limit=limit)
+            if cursors[node] is not None:
+                params["since"] = cursors[node]
+            tasks = api.tasks.get(**params)
+            active = None
+            if running[node]:
+                active = api.tasks.get(source="active")
+            return [] if not tasks else tasks, active
+
+        failing = set()
+        while True:
+            failed = []
+            for node, result, error in self.run_parallel(
+                poll,
+                proxmox_nodes,
+                workers=max(1, len(proxmox_nodes)),
+                timeout=self.node_timeout
+            ):
+                if error:
+                    failed.append((node, error))
+                    continue
+                tasks, active = result
+                for task in sorted(tasks, key=lambda t: t["starttime"]):
+                    if task["upid"] in seen[node]:
+                        continue
+                    seen[node].add(task["upid"])
+                    if "endtime" not in task:
+                        running[node][task["upid"]] = task
+                    yield "new", task
+                if active is not None:
+                    active = {t["upid"] for t in active}
+                    yield from self.finished_tasks(node, running[node], active)
+                if tasks:
+                    cursors[node] = max(
+                        [t["starttime"] for t in tasks]
+                        + [cursors[node] or 0]
+                    )
+                    # the api since bound is inclusive, keep only the
+                    # identifiers that can be listed again
+                    seen[node] = {
+                        t["upid"] for t in tasks
+                        if t["starttime"] >= cursors[node]
+                    }
+            # a node is reported once when it stops answering
+            self.report_failed_nodes(
+                "tasks", [f for f in failed if f[0] not in failing]
+            )
+            failing = {node for node, _ in failed}
+            time.sleep(interval)
+
+    def finished_tasks(self, node, running, active) -> Any:
+        """yield ("finished", task) for running tasks no longer active"""
+        for upid in [u for u in running if u not in active]:
+            try:
+                status = self.proxmox_instance.nodes(node).tasks(
+                    upid).status.get()
+            except ResourceException:
+                continue
+            if status.get("status") != "stopped":
+                continue
+            task = running.pop(upid)
+            task["status"] = status.get("exitstatus")
+            if "endtime" in status:
+                task["endtime"] = status["endtime"]
+            yield "finished", task
+
     def get_nodes_network(
             self,
             proxmox_nodes=None,
-            output_format="table"
+            output_format="table",
+            timeout=None
     ) -> Any:
-        """get the default ip address from a node"""
-        if not proxmox_nodes:
-            return []
-        proxmox_nodes = proxmox_nodes.split(",")
+        """
+        get the network configuration of nodes, queried concurrently
+
+            Parameters:
+                proxmox_nodes (str): coma separated list of nodes or "all"
+                                     for every online node
+                output_format (str): internal, json, yaml or table
+                timeout (float): per node deadline in seconds
+            Returns:
+                dict with the interfaces of the nodes that answered under
+                networks and the nodes that failed under failed_nodes, a
+                table of the interfaces for table output. failed nodes are
+                also reported on stderr
+        """
+        if proxmox_nodes == "all":
+            proxmox_nodes = self.select_online_nodes(
+                self.get_nodes(output_format="internal")
+            )
+        else:
+            proxmox_nodes = proxmox_nodes.split(",") if proxmox_nodes else []
         networks = []
-        for node in proxmox_nodes:
-            result = self.proxmox_instance.nodes(node).network.get()
-            result = [] if not result else result
-            for net in result:
+        failed = []
+        for node, result, error in self.run_parallel(
+            lambda node: self.proxmox_instance.nodes(node).network.get(),
+            proxmox_nodes,
+            workers=max(1, len(proxmox_nodes)),
+            timeout=self.node_timeout if timeout is None else timeout
+        ):
+            if error:
+                failed.append((node, error))
+                continue
+            for net in [] if not result else result:
                 net["node"] = node
                 networks.append(net)
-        self.output(
+        self.report_failed_nodes("network", failed)
+        if output_format != "table":
+            networks = self.with_failed_nodes("networks", networks, failed)
+        return self.output(
             data=networks,
             output_format=output_format,
             headers=self.headers_node_networks
         )
 
+    def report_failed_nodes(self, what, failed) -> None:
+        """
+        print the nodes that did not answer a cluster wide request
+        on stderr, json and yaml outputs are kept parsable
+        """
+        if failed:
+            Console(stderr=True).print(
+                f"[yellow]{what} unavailable on "
+                f"{len(failed)} node(s): "
+                + ", ".join(f"{node} ({error})" for node, error in failed)
+                + "[/yellow]"
+            )
+
+    def with_failed_nodes(self, key, results, failed) -> dict:
+        """partial results of a cluster wide request and its failed nodes"""
+        return {
+            key: results,
+            "failed_nodes": [
+                {"node": node, "error": str(error)} for node, error in failed
+            ]
+        }
+
     # VMS #
 
     def exists_vm(self, virtual_machine_id=None, virtual_machine_name=None) -> bool:
         """ check if a vm exists by name or vmid """
-        vms = self.get_vms(output_format="internal")
-        vms = [] if not vms else vms
+        index = self.get_vms_index()
         if virtual_machine_id:
-            vms = [v for v in vms if int(v["vmid"]) == int(virtual_machine_id)]
-        else:
-            vms = [v for v in vms if v["name"] == virtual_machine_name]
-
-        return True if len(vms) > 0 else False
+            return int(virtual_machine_id) in index.by_vmid
+        return virtual_machine_name in index.by_name
 
     def get_vm_by_id_or_name(self, vmid=None, vmname=None) -> Any:
         """get vm by its id or name"""
-        vms = self.get_vms(output_format="internal")
-        vms = [] if not vms else vms
-        virtual_machine = None
+        index = self.get_vms_index()
         if vmid:
-            virtual_machine = [v for v in vms if v["vmid"] == int(vmid)]
+            virtual_machine = index.by_vmid.get(int(vmid))
         else:
-            virtual_machine = [v for v in vms if v["name"] == vmname]
-        if len(virtual_machine) == 0:
+            virtual_machine = index.by_name.get(vmname, [None])[0]
+        if not virtual_machine:
             return False
-        return virtual_machine[0]
+        return copy.deepcopy(virtual_machine)
 
     def get_vms_config(self, vmid) -> Any:
         """get virtual machine config"""
@@ -1015,31 +2437,73 @@ class Proxmox():
         vmid=-1,
         timeout=30
     ) -> None:
-        """wait for selected vms to reach desired status"""
-        def get_vms(vmid=-1, name="", filter_name=""):
-            if (vmid > 0 or name != "") and filter_name == "":
-                vm = self.get_vm_by_id_or_name(vmid=vmid, vmname=name)
-                vms = [vm,]
-            elif (vmid == -1 and name == "" and filter_name != ""):
-                vms = self.get_vms(
-                    output_format="internal",
-                    filter_name=filter_name
+        """
+        wait for selected vms to reach desired status
+        the watched vms are selected once, then each poll is a single
+        status read with an adaptive, jittered delay between polls
+        """
+        self.invalidate("vms")
+        vms = self.get_vms_snapshot()
+        if (vmid > 0 or name != "") and filter_name == "":
+            vms = [
+                v for v in vms
+                if (v["vmid"] == vmid if vmid > 0 else v["name"] == name)
+            ][:1]
+        elif vmid == -1 and name == "" and filter_name != "":
+            vms = self.filter_vms(vms, filter_name=filter_name, status=None)
+        else:
+            vms = []
+        if len(vms) == 0:
+            return
+        watched = {v["vmid"]: v for v in vms}
+        reached = set()
+        delay = WAIT_DELAY_MIN
+        start = time.monotonic()
+        while True:
+            for current in self.get_vms_status(watched.values()):
+                if current["vmid"] in reached or current["status"] != status:
+                    continue
+                reached.add(current["vmid"])
+                rprint(
+                    f"[{len(reached)}/{len(watched)}] vm "
+                    f"{watched[current['vmid']]['name']} "
+                    f"({current['vmid']}) is {status}"
                 )
-            return vms
-        status_ready = False
-        start = int(time.time())
-        while not status_ready:
-            vms = get_vms(vmid=vmid, name=name, filter_name=filter_name)
-            if len(vms) == 0:
+            if len(reached) == len(watched):
+                self.invalidate("vms")
                 return
-            vms_status = [v["status"] for v in vms if status == v["status"]]
-            if len(vms_status) == len(vms):
-                status_ready = True
-            else:
-                time.sleep(0.5)
-            if time.time() - start > timeout:
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
                 raise proxcli_exceptions.VmWaitForStatusTimeoutException
-        return
+            time.sleep(min(remaining, delay * random.uniform(0.8, 1.2)))
+            delay = min(delay * WAIT_DELAY_FACTOR, WAIT_DELAY_MAX)
+
+    def get_vms_status(self, vms) -> list:
+        """
+        current vmid and status of the given vms
+        a single /cluster/resources read, or status/current per vm when the
+        cluster resources are not available
+        """
+        vmids = {v["vmid"] for v in vms}
+        try:
+            resources = self.get_cluster_resources(resource_type="vm")
+            return [
+                {"vmid": int(r["vmid"]), "status": r.get("status", "unknown")}
+                for r in resources
+                if r.get("type") == "qemu" and int(r["vmid"]) in vmids
+            ]
+        except ResourceException:
+            pass
+        states = []
+        for virtual_machine in vms:
+            current = self.proxmox_instance.nodes(
+                virtual_machine["node"]
+            ).qemu(virtual_machine["vmid"]).status.current.get()
+            states.append({
+                "vmid": virtual_machine["vmid"],
+                "status": current.get("status", "unknown")
+            })
+        return states
 
     def resize_vms_disk(
             self,
@@ -1050,6 +2514,7 @@ class Proxmox():
             disk=None
     ) -> None:
         """resize the first virtual machine disk"""
+        self.bypass_disk_cache()
 
         def get_disk(vmid):
             # if disk is not specified resize the default boot disk
@@ -1073,8 +2538,8 @@ class Proxmox():
                 **{"disk": disk, "size": size}
             )
         else:
-            vms = self.get_vms(
-                output_format="internal",
+            vms = self.filter_vms(
+                self.get_vms_snapshot(),
                 filter_name=filter_name
             )
             for vm in vms:
@@ -1089,6 +2554,7 @@ class Proxmox():
                     vm["node"]).qemu(vm["vmid"]).resize.put(
                         **{"disk": disk, "size": size}
                     )
+        self.invalidate("vms")
 
     def set_vms(
                 self,
@@ -1105,13 +2571,22 @@ class Proxmox():
                 ciuser=None,
                 boot=None,
                 sshkey=None
-    ) -> None:
-        """set vm config parameters"""
+    ) -> dict:
+        """
+        set vm config parameters
+        current configs are read concurrently and only the vms with
+        different values are written, in parallel
+
+            Returns:
+                summary dict with changed (and their keys), unchanged
+                and failed vms lists
+        """
+        self.bypass_disk_cache()
         vms = []
         if len(filter_name) > 0:
             # we work on a list of vms based on name filter
-            vms = self.get_vms(
-                output_format="internal",
+            vms = self.filter_vms(
+                self.get_vms_snapshot(),
                 filter_name=filter_name
             )
         else:
@@ -1143,10 +2618,65 @@ class Proxmox():
             data["boot"] = boot
         if sshkey and len(sshkey) > 0:
             data["sshkeys"] = urllib_parse.quote(sshkey.strip(), safe='')
-        for vm in vms:
+        if not data:
+            return {"changed": [], "unchanged": [], "failed": []}
+
+        def current_config(vm):
+            return self.proxmox_instance.nodes(
+                vm["node"]
+            ).qemu(vm["vmid"]).config.get()
+
+        summary = {"changed": [], "unchanged": [], "failed": []}
+        pending = []
+        for vm, config, error in self.run_parallel(
+            current_config, vms, workers=self.concurrency_workers
+        ):
+            entry = {"vmid": vm["vmid"], "name": vm["name"]}
+            if error:
+                summary["failed"].append(dict(entry, error=str(error)))
+                continue
+            changes = self.config_changes(config, data)
+            if changes:
+                pending.append((vm, changes))
+            else:
+                summary["unchanged"].append(entry)
+
+        def apply(job):
+            vm, changes = job
             self.proxmox_instance.nodes(
                 vm["node"]
-            ).qemu(vm["vmid"]).config.put(**data)
+            ).qemu(vm["vmid"]).config.put(**changes)
+
+        for (vm, changes), _, error in self.run_parallel(
+            apply, pending, workers=self.concurrency_workers
+        ):
+            entry = {"vmid": vm["vmid"], "name": vm["name"]}
+            if error:
+                summary["failed"].append(dict(entry, error=str(error)))
+            else:
+                summary["changed"].append(dict(entry, keys=sorted(changes)))
+        if pending:
+            self.invalidate("vms")
+        return summary
+
+    def config_changes(self, config, data) -> dict:
+        """
+        keys of data whose value differs from the current vm config
+        cipassword is always kept, the api only returns it masked
+        """
+        changes = {}
+        for key, value in data.items():
+            current = config.get(key)
+            if key == "cipassword":
+                changes[key] = value
+            elif key == "sshkeys":
+                if urllib_parse.unquote(str(current or "")).strip() != (
+                    urllib_parse.unquote(value).strip()
+                ):
+                    changes[key] = value
+            elif current is None or str(current) != str(value):
+                changes[key] = value
+        return changes
 
     def get_vm_public_ip(self, proxmox_node, vmid, net_type="ipv4") -> Any:
         '''
@@ -1160,10 +2690,16 @@ class Proxmox():
         interfaces = None
         try:
             agent = self.proxmox_instance.nodes(proxmox_node).qemu(vmid).agent
-            interfaces = [i for i in agent.get(
-                "network-get-interfaces")["result"] if "ip-addresses" in i]
+            interfaces = agent.get("network-get-interfaces")["result"]
         except ResourceException:
             pass
+        return self.parse_vm_interfaces(interfaces, net_type)
+
+    def parse_vm_interfaces(self, interfaces, net_type="ipv4") -> list:
+        """
+        extract {name, ip} pairs from a guest agent network-get-interfaces
+        result
+        """
         ifaces = []
         if interfaces:
             for interface in interfaces:
@@ -1177,12 +2713,176 @@ class Proxmox():
                                 {"name": name, "ip": ip["ip-address"]}
                             )
         return ifaces
-        
+
+    def resolve_vms_public_ip(self, vms) -> list:
+        """
+        add the ip key to each vm of the list
+        guest agents of running vms are queried concurrently, vms whose
+        agent does not answer before the deadline get IP_UNKNOWN
+
+        with the on disk cache enabled, the addresses are cached under
+        the vms ttl and reused when they cover every running vm
+        """
+        running = [v for v in vms if v["status"] == "running"]
+        for virtual_machine in vms:
+            virtual_machine["ip"] = []
+        entry = self.disk_cache_load("vms:ips") if self.cache_enabled else None
+        cached = {int(k): v for k, v in entry[0].items()} if entry else {}
+        if all(v["vmid"] in cached for v in running):
+            self.api_calls_avoided += len(running)
+            for virtual_machine in running:
+                virtual_machine["ip"] = cached[virtual_machine["vmid"]]
+            return vms
+        results = self.run_parallel(
+            lambda vm: self.get_vm_public_ip(
+                proxmox_node=vm["node"],
+                vmid=vm["vmid"]
+            ),
+            running,
+            workers=self.agent_workers,
+            timeout=self.agent_timeout
+        )
+        resolved = {}
+        for virtual_machine, ips, error in results:
+            virtual_machine["ip"] = IP_UNKNOWN if error else ips
+            if not error:
+                resolved[virtual_machine["vmid"]] = ips
+        # agents that did not answer are asked again next time
+        if self.cache_enabled and len(resolved) == len(running):
+            self.disk_cache_save("vms:ips", resolved, len(running))
+        return vms
+
     def ips_to_display(self, ips):
         """convert a list of ip addresses to display string"""
         ips = [f"{ip['name']}: {ip['ip']}" for ip in ips]
         return "\n".join(ips)
 
+    def get_cluster_resources(self, resource_type=None) -> list:
+        """get cluster wide resources (vm, storage, node, sdn) in one call"""
+        resources = self.proxmox_instance.cluster.resources.get(
+            type=resource_type
+        )
+        return [] if not resources else resources
+
+    def get_vms_per_node(self, guest_types=("qemu",)) -> list:
+        """
+        retrieve guests by querying every online node one after another
+        only used when /cluster/resources is not available
+        """
+        all_nodes = self.get_nodes()
+        all_nodes = [] if not all_nodes else all_nodes
+        vms = []
+        for node in [n for n in all_nodes if n["status"] == "online"]:
+            for guest_type in guest_types:
+                endpoint = getattr(
+                    self.proxmox_instance.nodes(node["node"]),
+                    guest_type
+                )
+                guests = endpoint.get()
+                guests = [] if not guests else guests
+                for virtual_machine in guests:
+                    virtual_machine["node"] = node["node"]
+                    virtual_machine["type"] = guest_type
+                    virtual_machine["vmid"] = int(virtual_machine["vmid"])
+                    virtual_machine.setdefault("tags", "")
+                    virtual_machine.setdefault("name", "")
+                    virtual_machine.setdefault("template", 0)
+                    vms.append(virtual_machine)
+        return vms
+
+    def get_vms_snapshot(self, guest_types=("qemu",)) -> list:
+        """
+        build the cluster guests list from a single /cluster/resources call
+
+            Parameters:
+                guest_types (tuple): guest types to keep (qemu, lxc)
+            Returns:
+                list of guests (vmid, name, node, status, tags, mem,
+                cpu, template, ...) without ip addresses
+        """
+        return self.cached(
+            f"vms:{','.join(guest_types)}",
+            lambda: self.load_vms_snapshot(guest_types)
+        )
+
+    def get_vms_index(self, guest_types=("qemu",)) -> VmIndex:
+        """
+        snapshot vms indexed by vmid, name and node
+        built once per fetch, the returned index must not be modified
+        """
+        key = f"vms:{','.join(guest_types)}"
+        if key not in self.indexes:
+            self.indexes[key] = self.build_vms_index(
+                self.get_vms_snapshot(guest_types)
+            )
+        return self.indexes[key]
+
+    def build_vms_index(self, vms) -> VmIndex:
+        """index a vms list by vmid, name and node"""
+        index = VmIndex(by_vmid={}, by_name={}, by_node={})
+        for virtual_machine in vms:
+            index.by_vmid[virtual_machine["vmid"]] = virtual_machine
+            index.by_name.setdefault(
+                virtual_machine["name"], []
+            ).append(virtual_machine)
+            index.by_node.setdefault(
+                virtual_machine["node"], []
+            ).append(virtual_machine)
+        return index
+
+    def load_vms_snapshot(self, guest_types) -> list:
+        """uncached get_vms_snapshot"""
+        try:
+            resources = self.get_cluster_resources(resource_type="vm")
+        except ResourceException:
+            return self.get_vms_per_node(guest_types=guest_types)
+        return self.vms_from_resources(resources, guest_types)
+
+    def vms_from_resources(self, resources, guest_types=("qemu",)) -> list:
+        """build the guests list from /cluster/resources?type=vm entries"""
+        vms = []
+        for resource in resources:
+            if resource.get("type") not in guest_types:
+                continue
+            virtual_machine = dict(resource)
+            virtual_machine["vmid"] = int(resource["vmid"])
+            virtual_machine["status"] = resource.get("status", "unknown")
+            virtual_machine.setdefault("tags", "")
+            virtual_machine.setdefault("name", "")
+            virtual_machine.setdefault("template", 0)
+            vms.append(virtual_machine)
+        return vms
+
+    def filter_vms(
+            self,
+            vms,
+            filter_name=None,
+            proxmox_nodes=None,
+            status="stopped,running"
+    ) -> list:
+        """
+        filter a vms list on name regex, nodes and status
+
+            Parameters:
+                vms     (list): vms list as returned by get_vms_snapshot
+                filter  (str): regex applied on vm name
+                nodes   (str): coma separated list of nodes
+                status  (str): coma separated list of vms status
+            Returns:
+                filtered vms list
+        """
+        if proxmox_nodes:
+            proxmox_nodes = str(proxmox_nodes).split(",")
+            vms = [v for v in vms if v["node"] in proxmox_nodes]
+        if status:
+            status = status.split(",")
+            vms = [v for v in vms if v["status"] in status]
+        if filter_name:
+            vms = [
+                v for v in vms if self.ismatching(filter_name, v["name"])
+            ]
+        return vms
+
     def get_vms(
             self,
             output_format="json",
@@ -1202,54 +2902,14 @@ class Proxmox():
             Returns:
                 list of vms in the specified format
         '''
-        all_nodes = self.get_nodes()
-        updated_vms = []
-
-        if not proxmox_nodes and all_nodes:
-            all_nodes = [n for n in all_nodes if n["status"] == "online"]
-        else:
-            proxmox_nodes = str(proxmox_nodes).split(",")
-            all_nodes = [] if not all_nodes else all_nodes
-            all_nodes = [
-                            n for n in all_nodes if
-                            n["status"] == "online" and
-                            n["node"] in proxmox_nodes
-                        ]
-        proxmox_nodes = all_nodes
-
-        status = status.split(",")
-
-        for node in proxmox_nodes:
-            vms = self.proxmox_instance.nodes(node["node"]).qemu.get()
-            vms = [] if not vms else vms
-            for virtual_machine in vms:
-                # add on which node the vm is running
-                virtual_machine["node"] = node["node"]
-                # add ip address if found
-                if (
-                    "status" in virtual_machine and
-                    virtual_machine["status"] == "running"
-                ):
-                    ips = self.get_vm_public_ip(
-                        proxmox_node=virtual_machine["node"],
-                        vmid=virtual_machine["vmid"]
-                    )
-                    virtual_machine["ip"] = ips
-                else:
-                    virtual_machine["ip"] = []
-                # if tags are empty create an empty key:value pair
-                if "tags" not in virtual_machine.keys():
-                    virtual_machine["tags"] = ""
-                # filter on status
-                if virtual_machine["status"] in status:
-                    # apply filter on vms
-                    if filter_name and self.ismatching(
-                        filter_name,
-                        virtual_machine["name"]
-                    ):
-                        updated_vms.append(virtual_machine)
-                    elif not filter_name:
-                        updated_vms.append(virtual_machine)
+        updated_vms = self.filter_vms(
+            self.get_vms_snapshot(),
+            filter_name=filter_name,
+            proxmox_nodes=proxmox_nodes,
+            status=status
+        )
+        # add ip address if found
+        self.resolve_vms_public_ip(updated_vms)
         return self.output(
             headers=self.headers_qemu,
             data=updated_vms,
@@ -1258,16 +2918,14 @@ class Proxmox():
 
     def migrate_vms(self, proxmox_node, filter_name=None, vmid=None) -> None:
         """migrate vm from a node to another one"""
+        self.bypass_disk_cache()
         if filter_name and vmid:
             raise proxcli_exceptions.VmIdMutualyExclusiveException
-        vms = self.get_vms(output_format="internal")
-        vms = [] if not vms else vms
         if vmid:
-            vms = [v for v in vms if int(v["vmid"]) == int(vmid)]
-            if len(vms) != 1:
+            virtual_machine = self.get_vms_index().by_vmid.get(int(vmid))
+            if not virtual_machine:
                 raise proxcli_exceptions.ProxmoxVmNotFoundException
-            else:
-                virtual_machine = vms[0]
+            self.invalidate("vms")
             node = self.proxmox_instance.nodes(virtual_machine["node"])
             node.qemu(vmid).migrate.post(
                 **{
@@ -1277,6 +2935,8 @@ class Proxmox():
                 }
             )
         else:
+            vms = self.filter_vms(self.get_vms_snapshot())
+            self.invalidate("vms")
             for virtual_machine in vms:
                 if self.ismatching(filter_name, virtual_machine["name"]):
                     # this vm match filter
@@ -1299,97 +2959,440 @@ class Proxmox():
                         )
                     )
 
-    def set_tags(self, tags="", filter_name=None, set_mode="replace") -> None:
-        """set virtual machine tags"""
-        vms = self.get_vms(output_format="internal", filter_name=filter_name)
-        vms = [] if not vms else vms
+    def set_tags(self, tags="", filter_name=None, set_mode="replace") -> dict:
+        """
+        set virtual machine tags
+        the target tags of each vm are computed from the vms snapshot and
+        only the vms whose tags change are written, concurrently
+
+            Parameters:
+                tags (str): coma or semicolon separated tags
+                filter_name (str): regex applied on vm names
+                set_mode (str): replace or append
+            Returns:
+                summary dict with changed, unchanged and failed vms lists
+        """
+        self.bypass_disk_cache()
+        vms = self.filter_vms(
+            self.get_vms_snapshot(),
+            filter_name=filter_name
+        )
+        requested = self.parse_tags(tags)
+        summary = {"changed": [], "unchanged": [], "failed": []}
+        pending = []
         for virtual_machine in vms:
-            if set_mode == "append":
-                # normalize and extract tags list
-                existing_tags = ([] if virtual_machine["tags"] == ""
-                                 else virtual_machine["tags"].replace(
-                    ";", ","
-                ).split(","))
-                # add tags
-                append_tags = tags.replace(";", ",").split(",")
-                # merge the existing and appending
-                tags = existing_tags + append_tags
-                # deduplicate if needed
-                tags = list(set(tags))
-                # merge in a coma separated list
-                tags = ",".join(tags)
+            existing = self.parse_tags(virtual_machine["tags"])
+            target = existing | requested if set_mode == "append" else (
+                requested
+            )
+            entry = {
+                "vmid": virtual_machine["vmid"],
+                "name": virtual_machine["name"]
+            }
+            if target == existing:
+                summary["unchanged"].append(entry)
+            else:
+                pending.append((virtual_machine, ",".join(sorted(target))))
+
+        def apply(job):
+            virtual_machine, target = job
             node = self.proxmox_instance.nodes(virtual_machine["node"])
-            node.qemu(virtual_machine["vmid"]).config.put(**{'tags': tags})
+            node.qemu(virtual_machine["vmid"]).config.put(**{'tags': target})
+
+        for (virtual_machine, target), _, error in self.run_parallel(
+            apply, pending, workers=self.concurrency_workers
+        ):
+            entry = {
+                "vmid": virtual_machine["vmid"],
+                "name": virtual_machine["name"]
+            }
+            if error:
+                summary["failed"].append(dict(entry, error=str(error)))
+            else:
+                summary["changed"].append(dict(entry, tags=target))
+        if pending:
+            self.invalidate("vms")
+        return summary
+
+    def parse_tags(self, tags) -> set:
+        """set of tags from a coma, semicolon or space separated string"""
+        return {t for t in re.split(r"[;,\s]+", tags or "") if t}
 
     def get_tags(self) -> None:
         """list virtual machine tags"""
         # get a list of all tags present in all vms
-        vms = self.get_vms(output_format="internal")
-        vms = [] if not vms else vms
-        extract = [v["tags"] for v in vms if len(v["tags"]) > 0]
-        tags = [element.replace(";", ",").split(",") for element in extract]
-        tags = list(set([item for sublist in tags for item in sublist]))
-        print(", ".join(tags))
-
-    def delete_vms(self, fitler_name="", vmid=-1, block=True) -> None:
-        """ delete vms matching specified regex applied on vm names """
-        virtual_machines = self.get_vms(
-            output_format="internal",
-            filter_name=fitler_name
+        tags = set()
+        for virtual_machine in self.get_vms_snapshot():
+            tags |= self.parse_tags(virtual_machine["tags"])
+        print(", ".join(sorted(tags)))
+
+    def delete_vms(
+            self,
+            fitler_name="",
+            vmid=-1,
+            block=True,
+            stop=False,
+            workers=None,
+            timeout=None
+    ) -> dict:
+        """
+        delete vms matching specified regex applied on vm names or vmid
+
+            Parameters:
+                fitler_name (str): regex applied on vm names
+                vmid (int): a single vm id
+                block (bool): wait for the deletion tasks
+                stop (bool): stop running vms first instead of skipping
+                             them (or failing for a single vmid)
+                workers (int): maximum number of concurrent requests
+                timeout (float): overall wait deadline in seconds
+            Returns:
+                summary dict with succeeded, failed, timeout and skipped
+                vms lists
+            Raises:
+                ProxmoxTasksFailedException: a single vmid deletion failed
+        """
+        self.bypass_disk_cache()
+        virtual_machines = self.filter_vms(
+            self.get_vms_snapshot(),
+            filter_name=fitler_name,
+            status=None
         )
-        if not virtual_machines:
-            virtual_machines = []
         if vmid > 0:
-            if vmid not in [v["vmid"] for v in virtual_machines]:
-                raise proxcli_exceptions.ProxmoxVmNotFoundException
-            virtual_machine = [
+            virtual_machines = [
                 v for v in virtual_machines if vmid == v["vmid"]
-            ][0]
-            if virtual_machine["status"] != "stopped":
-                raise proxcli_exceptions.ProxmoxVmNeedStopException
-            node = self.proxmox_instance.nodes(virtual_machine["node"])
-            delete_job_id = node.qemu(vmid).delete()
-            if block:
-                self.task_block(delete_job_id)
-        else:
-            results = []
-            if len(virtual_machines) == 0:
-                raise proxcli_exceptions.ProxmoxVmNotFoundException
-            for virtual_machine in virtual_machines:
-                if virtual_machine["status"] == "stopped":
-                    node = self.proxmox_instance.nodes(virtual_machine["node"])
-                    results.append(
-                        node.qemu(virtual_machine["vmid"]).delete())
-            for result in results:
-                if block:
-                    print(
-                        f"Wait for deletion task {result} to finish"
-                    )
-                    self.task_block(result)
-                else:
-                    print(f"Deletion task started {result}]")
+            ]
+        if len(virtual_machines) == 0:
+            raise proxcli_exceptions.ProxmoxVmNotFoundException
+        # vms of an offline node are in unknown state, they can neither
+        # be stopped nor deleted
+        running = [
+            v for v in virtual_machines if v["status"] in ("running", "paused")
+        ]
+        if vmid > 0 and running and not stop:
+            raise proxcli_exceptions.ProxmoxVmNeedStopException
+        self.invalidate("vms", "ha_resources")
+
+        summary = {"succeeded": [], "failed": [], "timeout": [], "skipped": []}
+        deletable = [v for v in virtual_machines if v["status"] == "stopped"]
+        if running and stop:
+            print(f"Stopping {len(running)} running vms before deletion")
+            stopped = self.run_vms_tasks(
+                running,
+                lambda node, vmid: node.qemu(vmid).status.post("stop"),
+                workers=workers,
+                wait=True,
+                timeout=timeout
+            )
+            summary["failed"] += stopped["failed"]
+            summary["timeout"] += stopped["timeout"]
+            stopped = {v["vmid"] for v in stopped["succeeded"]}
+            deletable += [v for v in running if v["vmid"] in stopped]
+        summary["skipped"] = [
+            {
+                "vmid": v["vmid"],
+                "name": v["name"],
+                "node": v["node"],
+                "status": v["status"]
+            }
+            for v in virtual_machines
+            if v["status"] != "stopped" and (v not in running or not stop)
+        ]
+
+        if block:
+            print(f"Wait for {len(deletable)} deletion tasks to finish")
+        result = self.run_vms_tasks(
+            deletable,
+            lambda node, vmid: node.qemu(vmid).delete(),
+            workers=workers,
+            wait=block,
+            timeout=timeout
+        )
+        for key, entries in result.items():
+            summary[key] += entries
+        if vmid > 0 and (summary["failed"] or summary["timeout"]):
+            raise proxcli_exceptions.ProxmoxTasksFailedException([
+                dict(v, type="qmdestroy", id=v["vmid"],
+                     exitstatus=v.get("error", TASK_TIMEOUT))
+                for v in summary["failed"] + summary["timeout"]
+            ])
+        return summary
+
+    def set_vms_status(
+            self,
+            status=None,
+            filter_name=None,
+            vmid=None,
+            workers=None,
+            node_workers=None,
+            wait=False,
+            timeout=None
+    ) -> Any:
+        """
+        set status (start, stop, reset, suspend, shutdown, resume) of vms
+        matching filter or vmid
 
-    def set_vms_status(self, status=None, filter_name=None, vmid=None) -> Any:
-        """set status of vms matching filter or vmid"""
-        vms = self.get_vms(output_format="internal", filter_name=filter_name)
+            Parameters:
+                status (str): power action
+                filter_name (str): regex applied on vm names
+                vmid (int): a single vm id
+                workers (int): maximum number of concurrent requests
+                node_workers (int): maximum concurrent requests per node
+                wait (bool): wait for the power tasks to finish
+                timeout (float): overall wait deadline in seconds
+            Returns:
+                False when no vm matches, a summary dict otherwise with
+                succeeded, failed and timeout vms lists. without wait a vm
+                succeeds as soon as its task is accepted
+        """
+        self.bypass_disk_cache()
+        vms = self.filter_vms(
+            self.get_vms_snapshot(),
+            filter_name=filter_name
+        )
+        if vmid:
+            vms = [v for v in vms if v["vmid"] == int(vmid)]
         if not vms:
             return False
-        results = []
-        if not vmid:
-            for virtual_machine in vms:
-                node = self.proxmox_instance.nodes(virtual_machine["node"])
-                results.append(
-                    node.qemu(virtual_machine["vmid"]).status.post(status)
-                )
-        else:
-            virtual_machine = [v for v in vms if v["vmid"] == vmid]
-            if len(virtual_machine) == 1:
-                node = virtual_machine[0]["node"]
-                results.append(
-                    self.proxmox_instance.nodes(node).qemu(vmid).status.post(
-                        status
+        return self.apply_vms_status(
+            vms,
+            status,
+            workers=workers,
+            node_workers=node_workers,
+            wait=wait,
+            timeout=timeout
+        )
+
+    def apply_vms_status(
+            self,
+            vms,
+            status,
+            workers=None,
+            node_workers=None,
+            wait=False,
+            timeout=None
+    ) -> dict:
+        """power action on a vms list, see set_vms_status"""
+        self.invalidate("vms")
+        return self.run_vms_tasks(
+            vms,
+            lambda node, vmid: node.qemu(vmid).status.post(status),
+            workers=workers,
+            node_workers=node_workers,
+            wait=wait,
+            timeout=timeout
+        )
+
+    def run_vms_tasks(
+            self,
+            vms,
+            action,
+            workers=None,
+            node_workers=None,
+            wait=False,
+            timeout=None
+    ) -> dict:
+        """
+        submit one task per vm concurrently and optionally wait for them
+
+            Parameters:
+                vms (list): vms as returned by get_vms_snapshot
+                action (callable): called with the node api and the vmid,
+                                   returns the task identifier
+                workers (int): maximum number of concurrent requests
+                node_workers (int): maximum concurrent requests per node
+                wait (bool): wait for the tasks with the shared waiter
+                timeout (float): overall wait deadline in seconds
+            Returns:
+                summary dict with succeeded, failed and timeout vms lists
+        """
+        workers = self.power_workers if workers is None else workers
+        node_workers = (
+            self.power_node_workers if node_workers is None else node_workers
+        )
+        node_slots = {
+            v["node"]: threading.BoundedSemaphore(node_workers)
+            for v in vms
+        } if node_workers else {}
+
+        def post(virtual_machine):
+            node = self.proxmox_instance.nodes(virtual_machine["node"])
+            if virtual_machine["node"] in node_slots:
+                with node_slots[virtual_machine["node"]]:
+                    return action(node, virtual_machine["vmid"])
+            return action(node, virtual_machine["vmid"])
+
+        summary = {"succeeded": [], "failed": [], "timeout": []}
+        upids = {}
+        for virtual_machine, upid, error in self.run_parallel(
+            post, vms, workers=workers
+        ):
+            entry = {
+                "vmid": virtual_machine["vmid"],
+                "name": virtual_machine["name"],
+                "node": virtual_machine["node"]
+            }
+            if error:
+                summary["failed"].append(dict(entry, error=str(error)))
+            elif wait and upid:
+                upids[upid] = entry
+            else:
+                summary["succeeded"].append(entry)
+        if upids:
+            for task in self.iter_tasks(list(upids), timeout=timeout):
+                entry = upids[task["upid"]]
+                if task["exitstatus"] == TASK_TIMEOUT:
+                    summary["timeout"].append(entry)
+                elif self.task_succeeded(task):
+                    summary["succeeded"].append(entry)
+                else:
+                    summary["failed"].append(
+                        dict(entry, error=task["exitstatus"])
                     )
-                )
+        return summary
+
+    def start_vms_in_waves(
+            self,
+            filter_name=None,
+            wave_size=None,
+            iowait=None,
+            wave_timeout=None,
+            workers=None,
+            node_workers=None,
+            timeout=None
+    ) -> dict:
+        """
+        start vms in waves to avoid storage io storms
+
+        vms are grouped by the shared storage holding their disks, across
+        all nodes, or by node for vms on local storages. each wave starts
+        up to wave_size stopped vms of every group, the next wave begins once every node of the wave is
+        below the io wait threshold or every vm of the wave answers the
+        guest agent ping, or after wave_timeout seconds. the start tasks
+        of a wave are always waited for
+
+            Parameters:
+                filter_name (str): regex applied on vm names
+                wave_size (int): vms started per group and wave
+                iowait (float): node io wait ratio considered idle
+                wave_timeout (float): maximum wait between two waves
+                workers (int): maximum number of concurrent requests
+                node_workers (int): maximum concurrent requests per node
+                timeout (float): start tasks wait deadline of each wave
+            Returns:
+                summary dict as returned by set_vms_status
+        """
+        self.bypass_disk_cache()
+        wave_size = self.wave_size if wave_size is None else wave_size
+        iowait = self.wave_iowait if iowait is None else iowait
+        wave_timeout = (
+            self.wave_timeout if wave_timeout is None else wave_timeout
+        )
+        vms = self.filter_vms(
+            self.get_vms_snapshot(),
+            filter_name=filter_name,
+            status="stopped"
+        )
+        summary = {"succeeded": [], "failed": [], "timeout": []}
+        waves = self.plan_waves(vms, wave_size)
+        for index, wave in enumerate(waves):
+            rprint(
+                f"wave {index + 1}/{len(waves)}: starting "
+                f"{', '.join(v['name'] for v in wave)}"
+            )
+            result = self.apply_vms_status(
+                wave,
+                "start",
+                workers=workers,
+                node_workers=node_workers,
+                wait=True,
+                timeout=timeout
+            )
+            for key, entries in result.items():
+                summary[key] += entries
+            if index < len(waves) - 1:
+                started = [
+                    v for v in wave
+                    if v["vmid"] in {e["vmid"] for e in result["succeeded"]}
+                ]
+                self.wait_wave_ready(started, iowait, wave_timeout)
+        return summary
+
+    def plan_waves(self, vms, wave_size) -> list:
+        """split vms into waves of at most wave_size vms per group"""
+        shared_storages = self.get_shared_storages()
+
+        def group(virtual_machine):
+            storages = sorted(
+                self.get_vm_storages(
+                    virtual_machine["node"],
+                    virtual_machine["vmid"]
+                ) & shared_storages
+            )
+            # a shared storage is one backend for every node
+            if storages:
+                return storages[0]
+            return (virtual_machine["node"], "local")
+
+        groups = {}
+        for virtual_machine, key, error in self.run_parallel(
+            group, vms, workers=self.concurrency_workers
+        ):
+            key = (virtual_machine["node"], "local") if error else key
+            groups.setdefault(key, []).append(virtual_machine)
+        waves = []
+        while any(groups.values()):
+            wave = []
+            for members in groups.values():
+                wave += members[:wave_size]
+                del members[:wave_size]
+            waves.append(wave)
+        return waves
+
+    def wait_wave_ready(self, vms, iowait, timeout) -> bool:
+        """
+        wait until the nodes of a wave are idle or its guest agents answer
+
+        the io wait of a node is still low right after the starts are
+        issued, nodes are only considered idle once the threshold held
+        for WAVE_IDLE_POLLS consecutive polls
+            Returns:
+                True when ready, False when the timeout elapsed
+        """
+        nodes = sorted({v["node"] for v in vms})
+        deadline = time.monotonic() + timeout
+        idle_polls = 0
+        while True:
+            time.sleep(min(
+                float(self.task_polling_interval),
+                max(0, deadline - time.monotonic())
+            ))
+            if time.monotonic() >= deadline:
+                break
+            loads = self.run_parallel(
+                lambda node: self.proxmox_instance.nodes(
+                    node).status.get().get("wait", 0),
+                nodes,
+                timeout=self.agent_timeout
+            )
+            if all(not e and float(w) <= iowait for _, w, e in loads):
+                idle_polls += 1
+            else:
+                idle_polls = 0
+            if idle_polls >= WAVE_IDLE_POLLS:
+                return True
+            pings = self.run_parallel(
+                lambda v: self.proxmox_instance.nodes(v["node"]).qemu(
+                    v["vmid"]).agent.ping.post(),
+                vms,
+                workers=self.agent_workers,
+                timeout=self.agent_timeout
+            )
+            if all(not error for _, _, error in pings):
+                return True
+        rprint(f"[yellow]wave not ready after {timeout}s, "
+               f"starting the next one[/yellow]")
+        return False
 
     def clone_vm(
             self,
@@ -1405,8 +3408,8 @@ class Proxmox():
             proxmox_nodes=""
     ) -> Any:
         """Clone a vm."""
-        vms = self.get_vms(output_format="internal")
-        virtual_machine = [v for v in vms if vmid == v["vmid"]]
+        self.bypass_disk_cache()
+        virtual_machine = self.get_vms_index().by_vmid.get(int(vmid))
 
         if len(proxmox_nodes) == 0:
             block = True
@@ -1414,10 +3417,8 @@ class Proxmox():
         else:
             proxmox_nodes = proxmox_nodes.split(",")
 
-        if len(virtual_machine) == 0:
+        if not virtual_machine:
             raise proxcli_exceptions.ProxmoxVmNotFoundException
-        else:
-            virtual_machine = virtual_machine[0]
 
         if virtual_machine["status"] != "stopped":
             raise proxcli_exceptions.ProxmoxVmNeedStopException
@@ -1425,7 +3426,6 @@ class Proxmox():
         src_node = virtual_machine["node"]
         dst_node = target
 
-        vmids = []
         if not duplicate or duplicate < 2:
             node = self.proxmox_instance.nodes(src_node)
             next_vmid = self.get_next_id()
@@ -1441,66 +3441,145 @@ class Proxmox():
                     "target": dst_node
                 }
             )
-            vmids.append(next_vmid)
+            self.invalidate("vms")
             if block:
                 self.task_block(result)
+            return [int(next_vmid)]
+
+        # every duplicate gets its vmid and node before the first post
+        vmids = self.reserve_vmids(duplicate)
+        if dst_node:
+            placement = [dst_node] * duplicate
+        elif strategy == "spread":
+            placement = [
+                proxmox_nodes[i * len(proxmox_nodes) // duplicate]
+                for i in range(duplicate)
+            ]
         else:
-            for index in range(duplicate):
-                instance_name = f"{name}-{str(index)}"
-                node = self.proxmox_instance.nodes(src_node)
-                next_vmid = self.get_next_id()
-                result = node.qemu(vmid).clone.post(**{
-                    "newid": next_vmid,
-                    "node": src_node,
-                    "vmid": int(vmid),
-                    "name": instance_name,
-                    "description": description,
-                    "full": full,
-                    "storage": storage,
-                    "target": dst_node
-                })
-                vmids.append(next_vmid)
-                if block:
-                    self.task_block(result)
-
-        def spread(ids, count):
-            """split vmids list in chunk with chunk count = nodes numbers"""
-            length = len(ids)
-            return [ids[i*length // count: (i+1)*length // count]
-                    for i in range(count)]
-        vms = self.get_vms(output_format="internal")
-
-        if strategy == "spread" and duplicate > 1:
-            chunks = spread(vmids, len(proxmox_nodes))
-            index = 0
-            for node in proxmox_nodes:
-                for vmid in chunks[index]:
-                    vm = [v for v in vms if str(v["vmid"]) == str(vmid)]
-                    ids = [v["vmid"] for v in vms]
-                    if len(vm) == 0:
-                        print(f"vm {vmid} not found")
-                    else:
-                        vm = vm[0]
-                        if vm["node"] == node:
-                            print(
-                                f"not migrating vm {vmid}. "
-                                f"Already on selected node {node}"
-                            )
-                            print(
-                                f"not migrating vm {vmid}. "
-                                f"Already on selected node {node}"
-                            )
-                        else:
-                            print(
-                                f"starting migration of vm {vmid} "
-                                f"to node {node}"
-                            )
-                            print(
-                                f"starting migration of vm {vmid} "
-                                f"to node {node}"
-                            )
-                            self.migrate_vms(proxmox_node=node, vmid=vmid)
-                index += 1
+            placement = [src_node] * duplicate
+
+        src_storages = self.get_vm_storages(src_node, vmid)
+        shared_storages = self.get_shared_storages()
+        direct = len(src_storages) > 0 and src_storages <= shared_storages
+        if virtual_machine["template"]:
+            workers = min(
+                [self.clone_workers.get(s, self.clone_workers["workers"])
+                 for s in src_storages] or [self.clone_workers["workers"]]
+            )
+        else:
+            # a regular vm is locked for the duration of each clone
+            workers = 1
+
+        jobs = [
+            {
+                "newid": newid,
+                "name": f"{name}-{str(index)}",
+                "node": placement[index]
+            } for index, newid in enumerate(vmids)
+        ]
+
+        # the vmids are only free in our snapshot, another client may take
+        # one of them meanwhile: such a clone is retried with a new vmid
+        taken = set(self.get_vms_index(("qemu", "lxc")).by_vmid) | set(vmids)
+        taken_lock = threading.Lock()
+
+        def clone(job):
+            target_node = job["node"] if direct else None
+            for attempt in range(CLONE_VMID_ATTEMPTS):
+                rprint(
+                    f"cloning vm {vmid} to {job['newid']} ({job['name']}) "
+                    f"on {target_node if target_node else src_node}"
+                )
+                try:
+                    upid = self.proxmox_instance.nodes(src_node).qemu(
+                        vmid).clone.post(**{
+                            "newid": job["newid"],
+                            "node": src_node,
+                            "vmid": int(vmid),
+                            "name": job["name"],
+                            "description": description,
+                            "full": full,
+                            "storage": storage,
+                            "target": target_node
+                        })
+                    break
+                except ResourceException as error:
+                    if (
+                        "already exists" not in str(error) or
+                        attempt == CLONE_VMID_ATTEMPTS - 1
+                    ):
+                        raise
+                with taken_lock:
+                    newid = max(taken) + 1
+                    taken.add(newid)
+                rprint(f"[yellow]vmid {job['newid']} was taken meanwhile, "
+                       f"retrying with {newid}[/yellow]")
+                job["newid"] = newid
+            # task_block returns None when the clone task timed out
+            status = self.task_block(upid)
+            if not status or not self.task_succeeded(status):
+                exitstatus = status["exitstatus"] if status else TASK_TIMEOUT
+                raise proxcli_exceptions.ProxmoxVmCloneFailedException(
+                    f"clone {job['newid']} failed: {exitstatus}"
+                )
+            return job
+
+        results = self.run_parallel(clone, jobs, workers=workers)
+        self.invalidate("vms")
+        failed = [(job, error) for job, _, error in results if error]
+        for job, error in failed:
+            rprint(f"[red]clone {job['newid']} ({job['name']}) failed: "
+                   f"{error}[/red]")
+
+        if not direct:
+            # local storage: clones land on the source node, move them
+            for job, _, error in results:
+                if error or job["node"] == src_node:
+                    continue
+                rprint(
+                    f"starting migration of vm {job['newid']} "
+                    f"to node {job['node']}"
+                )
+                self.migrate_vms(proxmox_node=job["node"], vmid=job["newid"])
+        return [job["newid"] for job, _, error in results if not error]
+
+    def reserve_vmids(self, count) -> list:
+        """
+        pick count free vmids starting from the cluster next id
+        ids already used by a guest are skipped so the whole range can be
+        planned before the first clone is created. nothing is locked on
+        the cluster, clone_vm retries a clone whose vmid got taken
+        """
+        used = set(self.get_vms_index(("qemu", "lxc")).by_vmid)
+        candidate = int(self.get_next_id())
+        vmids = []
+        while len(vmids) < count:
+            if candidate not in used:
+                vmids.append(candidate)
+            candidate += 1
+        return vmids
+
+    def get_vm_storages(self, proxmox_node, vmid) -> set:
+        """names of the storages holding the disks of a vm"""
+        config = self.proxmox_instance.nodes(proxmox_node).qemu(
+            vmid).config.get()
+        storages = set()
+        for key, value in config.items():
+            if not re.match(DISK_KEY_REGEX, key):
+                continue
+            if "media=cdrom" in str(value) or ":" not in str(value):
+                continue
+            storages.add(str(value).split(":", 1)[0])
+        return storages
+
+    def get_shared_storages(self) -> set:
+        """names of the storages flagged as shared"""
+        storages = self.cached(
+            "storages",
+            lambda: self.proxmox_instance.storage.get()
+        )
+        storages = [] if not storages else storages
+        return {s["storage"] for s in storages if s.get("shared")}
 
     def get_next_id(self) -> Any:
         """get next available container/vm id"""
@@ -1521,15 +3600,13 @@ class Proxmox():
             generate ansible inventory from virtual machine tags
             display or save in file
         """
-        vms = self.get_vms(output_format="internal")
+        # ip addresses are already resolved by get_vms
+        vms = self.get_vms(
+            output_format="internal",
+            filter_name=filter_name if filter_name != "" else None
+        )
         vms_enhanced = []
         for virtual_machine in vms:
-            if virtual_machine["status"] == "running":
-                vm_ip = self.get_vm_public_ip(
-                    virtual_machine["node"],
-                    virtual_machine["vmid"]
-                )
-                virtual_machine["ip"] = vm_ip
             if filter_name != "":
                 if re.match(
                     filter_name,
@@ -1542,7 +3619,9 @@ class Proxmox():
         inventory = {}
 
         for virtual_machine in vms_enhanced:
-            if virtual_machine["ip"] and virtual_machine["ip"] != "N/A":
+            if virtual_machine["ip"] and virtual_machine["ip"] not in (
+                "N/A", IP_UNKNOWN
+            ):
                 virtual_machine["ip"] = [
                     i["ip"] for i in virtual_machine[
                         "ip"
@@ -1607,7 +3686,7 @@ class Proxmox():
             f"qemu=vmid,name,status,pid,node,cpu,mem,template,ip,tags\n"
             f"lxc=vmid,name,status,pid,node,cpu,mem,ip,tags\n"
             f"storage=storage,node,content,type,active,enabled,shared,\
-used_fraction\n"
+total,used,avail,used_fraction\n"
             f"tasks=starttime,endtime,node,user,type,id,status\n"
             f"ha_groups=group,type,nodes,digest,restricted,nofailback\n"
             f"ha_resources=vmid,name,group,type,digest,\
@@ -1629,6 +3708,31 @@ RUNNING:blue,debug:violet\n"
             f"[tasks]\n"
             f"polling_interval=1\n"
             f"timeout=300\n"
+            f"[connection]\n"
+            f"probe_timeout=1\n"
+            f"node_timeout=10\n"
+            f"[agent]\n"
+            f"workers=16\n"
+            f"timeout=5\n"
+            f"[power]\n"
+            f"workers=8\n"
+            f"node_workers=0\n"
+            f"[concurrency]\n"
+            f"workers=8\n"
+            f"[waves]\n"
+            f"size=5\n"
+            f"iowait=0.1\n"
+            f"timeout=120\n"
+            f"[clone]\n"
+            f"workers=2\n"
+            f"[cache]\n"
+            f"enabled=no\n"
+            f"nodes=60\n"
+            f"vms=15\n"
+            f"ha_groups=300\n"
+            f"ha_resources=60\n"
+            f"storages=300\n"
+            f"storage_status=30\n"
         )
         home = os.environ.get("HOME")
         config_file = f"{home}/.proxmox"
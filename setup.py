@@ -12,6 +12,7 @@ setup(
     py_modules=[
         'proxcli',
         'proxmoxlib',
+        'asyncproxmoxlib',
         'proxcli_exceptions',
         'stack_config',
         'stack_operations'
@@ -29,6 +30,9 @@ setup(
         'PyYAML==6.0.1',
         'rich==13.6.0'
     ],
+    extras_require={
+        'async': ['aiohttp==3.9.5']
+    },
     entry_points='''
         [console_scripts]
         proxcli=proxcli:app
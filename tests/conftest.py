@@ -0,0 +1,14 @@
+"""Shared fixtures for proxcli tests"""
+from unittest.mock import MagicMock
+import pytest
+from proxmoxlib import Proxmox
+
+
+@pytest.fixture
+def proxmox(tmp_path, monkeypatch):
+    """Proxmox helper using a default config and a mocked api"""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    Proxmox().create_config(hosts="pve1", user="root@pam", password="secret")
+    proxmox_instance = Proxmox()
+    proxmox_instance.proxmox_instance = MagicMock()
+    return proxmox_instance
@@ -0,0 +1,83 @@
+#!/usr/bin/env pytest
+"""Test that AsyncProxmox returns the same shapes as Proxmox"""
+import asyncio
+import pytest
+from proxmoxer import ResourceException
+
+pytest.importorskip("aiohttp")
+
+# pylint: disable=wrong-import-position
+from asyncproxmoxlib import AsyncProxmox  # noqa: E402
+
+RESOURCES = [
+    {"type": "qemu", "vmid": 100, "name": "web", "node": "pve1",
+     "status": "running"},
+    {"type": "qemu", "vmid": 101, "name": "db", "node": "pve2",
+     "status": "stopped"},
+]
+INTERFACES = {"result": [
+    {"name": "lo", "ip-addresses": [
+        {"ip-address-type": "ipv4", "ip-address": "127.0.0.1"}]},
+    {"name": "eth0", "ip-addresses": [
+        {"ip-address-type": "ipv4", "ip-address": "10.0.0.5"}]},
+]}
+
+
+def test_get_vms_matches_sync(proxmox):
+    """async get_vms returns what the sync internal output returns"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = RESOURCES
+    api.nodes.return_value.qemu.return_value.agent.get.return_value = (
+        INTERFACES
+    )
+    expected = proxmox.get_vms(output_format="internal")
+
+    async def request(method, path, relogin=True, **params):
+        # pylint: disable=unused-argument
+        if path == "cluster/resources":
+            return [dict(r) for r in RESOURCES]
+        return INTERFACES
+
+    client = AsyncProxmox(proxmox=proxmox)
+    client.request = request
+    assert asyncio.run(client.get_vms()) == expected
+
+
+def test_get_tasks_matches_sync(proxmox):
+    """async get_tasks keeps the answering nodes and lists failed ones"""
+    nodes = [
+        {"node": "pve1", "status": "online"},
+        {"node": "pve2", "status": "online"}
+    ]
+    tasks = [{"upid": "a", "starttime": 30, "endtime": 31},
+             {"upid": "b", "starttime": 10}]
+    unreachable = ResourceException(
+        595, "Errors during connection establishment", "no route to host"
+    )
+    api = proxmox.proxmox_instance
+    api.nodes.get.return_value = nodes
+
+    def node(name):
+        node_api = type(api)()
+        if name == "pve2":
+            node_api.tasks.get.side_effect = unreachable
+        else:
+            node_api.tasks.get.return_value = [dict(t) for t in tasks]
+        return node_api
+
+    api.nodes.side_effect = node
+    expected = proxmox.get_tasks(limit=10)
+
+    async def request(method, path, relogin=True, **params):
+        # pylint: disable=unused-argument
+        if path == "nodes":
+            return nodes
+        if path == "nodes/pve2/tasks":
+            raise unreachable
+        return [dict(t) for t in tasks]
+
+    client = AsyncProxmox(proxmox=proxmox)
+    client.request = request
+    result = asyncio.run(client.get_tasks(limit=10))
+    assert result == expected
+    assert [f["node"] for f in result["failed_nodes"]] == ["pve2"]
@@ -0,0 +1,135 @@
+#!/usr/bin/env pytest
+"""Test proxmoxlib memory and on disk cache"""
+import time
+from unittest.mock import MagicMock
+from proxmoxlib import Proxmox
+
+NODES = [{"node": "pve1", "status": "online"}]
+
+
+def test_memory_cache(proxmox):
+    """repeated reads hit the api once until invalidated"""
+    proxmox.proxmox_instance.nodes.get.return_value = NODES
+    proxmox.get_nodes()
+    proxmox.get_nodes()
+    assert proxmox.proxmox_instance.nodes.get.call_count == 1
+    proxmox.invalidate("nodes")
+    proxmox.get_nodes()
+    assert proxmox.proxmox_instance.nodes.get.call_count == 2
+
+
+def test_disk_cache_shared_between_instances(proxmox):
+    """a second instance reads nodes from disk without connecting"""
+    proxmox.set_cache_policy(max_age=60)
+    proxmox.proxmox_instance.nodes.get.return_value = NODES
+    proxmox.get_nodes()
+    other = Proxmox()
+    other.set_cache_policy(max_age=60)
+    other.proxmox = MagicMock(side_effect=AssertionError("connected"))
+    assert other.get_nodes() == NODES
+
+
+def test_disk_cache_refresh(proxmox):
+    """refresh ignores cached entries"""
+    proxmox.set_cache_policy(max_age=60)
+    proxmox.proxmox_instance.nodes.get.return_value = NODES
+    proxmox.get_nodes()
+    other = Proxmox()
+    other.set_cache_policy(max_age=60, refresh=True)
+    other.proxmox_instance = MagicMock()
+    other.proxmox_instance.nodes.get.return_value = []
+    assert other.get_nodes() == []
+
+
+def test_invalidate_drops_disk_entries_without_cache(proxmox):
+    """a mutation purges disk entries even when the cache is not used"""
+    proxmox.set_cache_policy(max_age=60)
+    proxmox.proxmox_instance.nodes.get.return_value = NODES
+    proxmox.get_nodes()
+    other = Proxmox()
+    other.proxmox_instance = MagicMock()
+    other.invalidate("nodes")
+    last = Proxmox()
+    last.set_cache_policy(max_age=60)
+    last.proxmox_instance = MagicMock()
+    last.proxmox_instance.nodes.get.return_value = []
+    assert last.get_nodes() == []
+
+
+def test_mutations_bypass_disk_cache(proxmox):
+    """vms are resolved from the live cluster before a power action"""
+    stale = [{"type": "qemu", "vmid": 100, "name": "k8s-100",
+              "node": "pve1", "status": "stopped"}]
+    proxmox.set_cache_policy(max_age=60)
+    proxmox.proxmox_instance.cluster.resources.get.return_value = stale
+    proxmox.get_vms_snapshot()
+    other = Proxmox()
+    other.set_cache_policy(max_age=60)
+    other.proxmox_instance = MagicMock()
+    other.proxmox_instance.cluster.resources.get.return_value = []
+    assert other.set_vms_status("start", filter_name="^k8s-") is False
+    other.proxmox_instance.cluster.resources.get.assert_called_once()
+
+
+def test_api_calls_avoided(proxmox):
+    """each cache hit adds the api calls its loader needed"""
+    api = proxmox.proxmox_instance
+
+    def get_nodes():
+        proxmox.count_api_call(None)
+        return NODES
+
+    api.nodes.get.side_effect = get_nodes
+    proxmox.get_nodes()
+    proxmox.get_nodes()
+    proxmox.get_nodes()
+    assert proxmox.get_api_stats() == {
+        "api_calls": 1,
+        "api_calls_avoided": 2
+    }
+
+
+def test_disk_cache_connects_once(proxmox):
+    """concurrent agent lookups after a disk cache hit share one login"""
+    resources = [
+        {"type": "qemu", "vmid": vmid, "name": f"k8s-{vmid}", "node": "pve1",
+         "status": "running"} for vmid in range(100, 110)
+    ]
+    proxmox.set_cache_policy(max_age=60)
+    proxmox.proxmox_instance.cluster.resources.get.return_value = resources
+    proxmox.get_vms_snapshot()
+    other = Proxmox()
+    other.set_cache_policy(max_age=60)
+    connections = []
+
+    def connect():
+        connections.append(time.sleep(0.1))
+        return MagicMock()
+
+    other.proxmox = connect
+    vms = other.resolve_vms_public_ip(other.get_vms_snapshot())
+    assert len(vms) == 10
+    assert len(connections) == 1
+
+
+def test_vms_list_from_disk_cache_does_not_connect(proxmox):
+    """vms and their agent addresses are both served from disk"""
+    resources = [
+        {"type": "qemu", "vmid": 100, "name": "web", "node": "pve1",
+         "status": "running"}
+    ]
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = resources
+    api.nodes.return_value.qemu.return_value.agent.get.return_value = {
+        "result": [{"name": "eth0", "ip-addresses": [
+            {"ip-address-type": "ipv4", "ip-address": "10.0.0.1"}
+        ]}]
+    }
+    proxmox.set_cache_policy(max_age=60)
+    proxmox.get_vms(output_format="internal")
+    other = Proxmox()
+    other.set_cache_policy(max_age=60)
+    other.proxmox = MagicMock(side_effect=AssertionError("connected"))
+    vms = other.get_vms(output_format="internal")
+    assert vms[0]["ip"] == [{"name": "eth0", "ip": "10.0.0.1"}]
+    assert other.get_api_stats()["api_calls_avoided"] == 1
@@ -0,0 +1,93 @@
+#!/usr/bin/env pytest
+"""Test proxmoxlib concurrent clone pipeline"""
+from unittest.mock import MagicMock
+from proxmoxer import ResourceException
+
+RESOURCES = [
+    {"type": "qemu", "vmid": 100, "name": "tpl", "node": "pve1",
+     "status": "stopped", "template": 1},
+    {"type": "qemu", "vmid": 102, "name": "web", "node": "pve2",
+     "status": "running"},
+    {"type": "lxc", "vmid": 103, "name": "proxy", "node": "pve2",
+     "status": "running"},
+]
+
+
+def test_clone_duplicate_on_shared_storage(proxmox):
+    """vmids are reserved up front and clones are created on their node"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = RESOURCES
+    api.cluster.nextid.get.return_value = "101"
+    api.storage.get.return_value = [{"storage": "ceph", "shared": 1}]
+    qemu = api.nodes.return_value.qemu.return_value
+    qemu.config.get.return_value = {
+        "scsi0": "ceph:base-100-disk-0,size=8G",
+        "ide2": "none,media=cdrom"
+    }
+    qemu.clone.post.return_value = "UPID:pve1:clone"
+    proxmox.task_block = lambda upid: {"exitstatus": "OK"}
+
+    vmids = proxmox.clone_vm(
+        100, "worker", duplicate=4, proxmox_nodes="pve1,pve2"
+    )
+
+    assert vmids == [101, 104, 105, 106]
+    calls = sorted(
+        (c.kwargs["newid"], c.kwargs["target"])
+        for c in qemu.clone.post.call_args_list
+    )
+    assert calls == [
+        (101, "pve1"), (104, "pve1"), (105, "pve2"), (106, "pve2")
+    ]
+    api.nodes.return_value.qemu.return_value.migrate.post.assert_not_called()
+
+
+def test_clone_duplicate_timeout_is_failure(proxmox):
+    """timed out clones are not returned nor migrated"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = RESOURCES
+    api.cluster.nextid.get.return_value = "101"
+    api.storage.get.return_value = []
+    qemu = api.nodes.return_value.qemu.return_value
+    qemu.config.get.return_value = {"scsi0": "local-lvm:base-100-disk-0"}
+    qemu.clone.post.side_effect = lambda **kwargs: f"UPID:{kwargs['newid']}"
+    statuses = {
+        "UPID:101": {"exitstatus": "WARNINGS: 1"},
+        "UPID:104": None
+    }
+    proxmox.task_block = statuses.get
+    proxmox.migrate_vms = MagicMock()
+
+    vmids = proxmox.clone_vm(
+        100, "worker", duplicate=2, proxmox_nodes="pve1,pve2"
+    )
+
+    assert vmids == [101]
+    proxmox.migrate_vms.assert_not_called()
+
+
+def test_clone_duplicate_retries_taken_vmid(proxmox):
+    """a vmid taken by another client meanwhile is replaced"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = RESOURCES
+    api.cluster.nextid.get.return_value = "101"
+    api.storage.get.return_value = [{"storage": "ceph", "shared": 1}]
+    qemu = api.nodes.return_value.qemu.return_value
+    qemu.config.get.return_value = {"scsi0": "ceph:base-100-disk-0"}
+
+    def post(**kwargs):
+        if kwargs["newid"] == 104:
+            raise ResourceException(
+                500, "Internal Server Error",
+                "unable to create VM 104: config file already exists"
+            )
+        return f"UPID:{kwargs['newid']}"
+
+    qemu.clone.post.side_effect = post
+    proxmox.task_block = lambda upid: {"exitstatus": "OK"}
+
+    vmids = proxmox.clone_vm(
+        100, "worker", duplicate=2, proxmox_nodes="pve1,pve2"
+    )
+
+    assert vmids == [101, 105]
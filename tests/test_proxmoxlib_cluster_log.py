@@ -0,0 +1,35 @@
+#!/usr/bin/env pytest
+"""Test proxmoxlib cluster log filtering and follow mode"""
+import itertools
+
+
+def entry(uid, pri=6, node="pve1"):
+    """build a cluster log entry"""
+    return {"uid": uid, "time": 1700000000 + uid, "pri": pri, "node": node,
+            "msg": f"message {uid}"}
+
+
+def test_follow_cluster_log_grows_window_on_burst(proxmox, monkeypatch):
+    """entries are returned once, oldest first, even after a burst"""
+    monkeypatch.setattr("time.sleep", lambda delay: None)
+    log = proxmox.proxmox_instance.cluster.log
+    history = [entry(uid) for uid in range(3)]
+
+    def get(**params):
+        return list(reversed(history))[:params["max"]]
+
+    log.get.side_effect = get
+    entries = proxmox.follow_cluster_log("", "info", max_items=2)
+    assert [e["uid"] for e in itertools.islice(entries, 2)] == [1, 2]
+    history.extend(entry(uid) for uid in range(3, 8))
+    history.append(entry(8, pri=7))
+    assert [e["uid"] for e in itertools.islice(entries, 5)] == [3, 4, 5, 6, 7]
+    assert [c.kwargs["max"] for c in log.get.call_args_list] == [2, 2, 4, 8]
+
+
+def test_filter_cluster_log(proxmox):
+    """node and severity filters are applied before formatting"""
+    logs = [entry(1, pri=3), entry(2, node="pve2"), entry(3, pri=7)]
+    filtered = proxmox.filter_cluster_log(logs, "pve1", "error,info")
+    assert [(e["uid"], e["severity"]) for e in filtered] == [(1, "error")]
+    assert "severity" not in logs[1]
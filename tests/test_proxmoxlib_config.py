@@ -0,0 +1,58 @@
+#!/usr/bin/env pytest
+"""Test proxmoxlib diff aware config writes"""
+
+RESOURCES = [
+    {"type": "qemu", "vmid": vmid, "name": f"k8s-{vmid}", "node": "pve1",
+     "status": "running"} for vmid in (100, 101)
+]
+
+
+def test_set_vms_skips_compliant_vms(proxmox):
+    """only vms with different values are written"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = RESOURCES
+    configs = {
+        100: {"cores": 2, "memory": "4096", "sshkeys": "ssh-ed25519%20AAAA"},
+        101: {"cores": 4, "memory": "4096", "sshkeys": "ssh-ed25519%20AAAA"},
+    }
+    guests = {}
+
+    def qemu(vmid):
+        guest = guests.setdefault(vmid, type(api)())
+        guest.config.get.return_value = configs[vmid]
+        return guest
+
+    api.nodes.return_value.qemu.side_effect = qemu
+    summary = proxmox.set_vms(
+        vmid=-1, vmname="", filter_name="^k8s-", cores=2, sockets=-1,
+        cpulimit=-1, memory=4096, sshkey="ssh-ed25519 AAAA\n"
+    )
+    assert summary["changed"] == [
+        {"vmid": 101, "name": "k8s-101", "keys": ["cores"]}
+    ]
+    assert [v["vmid"] for v in summary["unchanged"]] == [100]
+    guests[100].config.put.assert_not_called()
+    guests[101].config.put.assert_called_once_with(cores=2)
+
+
+def test_set_tags_append_per_vm(proxmox):
+    """append mode merges each vm tags without leaking between vms"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = [
+        dict(RESOURCES[0], tags="k8s;master"),
+        dict(RESOURCES[1], tags="k8s;worker"),
+        dict(RESOURCES[1], vmid=102, name="k8s-102", tags="prod;k8s"),
+        dict(RESOURCES[1], vmid=103, name="k8s-103", status="unknown"),
+    ]
+    guests = {}
+    api.nodes.return_value.qemu.side_effect = (
+        lambda vmid: guests.setdefault(vmid, type(api)())
+    )
+    summary = proxmox.set_tags("prod", filter_name="^k8s-", set_mode="append")
+    assert [v["vmid"] for v in summary["unchanged"]] == [102]
+    guests[100].config.put.assert_called_once_with(tags="k8s,master,prod")
+    guests[101].config.put.assert_called_once_with(tags="k8s,prod,worker")
+    assert 102 not in guests
+    # vms of offline nodes are left alone
+    assert 103 not in guests
+    assert summary["failed"] == []
@@ -0,0 +1,162 @@
+#!/usr/bin/env pytest
+"""Test proxmoxlib host selection and authentication"""
+import os
+import stat
+import threading
+import time
+import pytest
+import requests
+import proxmoxlib
+from proxmoxlib import TICKET_LIFETIME
+import proxcli_exceptions
+
+
+def probe_answers(proxmox, latencies):
+    """replace probe_host, hosts missing from latencies are down"""
+    probed = []
+
+    def probe_host(host):
+        probed.append(host)
+        if host not in latencies:
+            raise requests.ConnectionError(f"{host} down")
+        return latencies[host]
+
+    proxmox.probe_host = probe_host
+    return probed
+
+
+def test_select_last_active_node_first(proxmox):
+    """the last known good host is used without probing the others"""
+    proxmox.hosts = ["pve1", "pve2", "pve3"]
+    proxmox.save_active_node("pve2", 0.1)
+    probed = probe_answers(proxmox, {"pve1": 0.1, "pve2": 0.1})
+    proxmox.select_active_node()
+    assert proxmox.host == "pve2"
+    assert probed == ["pve2"]
+
+
+def test_select_active_node_fallback(proxmox):
+    """a failing last host falls back to the other healthy hosts"""
+    proxmox.hosts = ["pve1", "pve2", "pve3"]
+    proxmox.save_active_node("pve1", 0.1)
+    probed = probe_answers(proxmox, {"pve3": 0.2})
+    proxmox.select_active_node()
+    assert proxmox.host == "pve3"
+    assert sorted(probed) == ["pve1", "pve2", "pve3"]
+    assert proxmox.load_active_node() == "pve3"
+
+
+def test_select_active_node_unexpected_error(proxmox):
+    """a probe raising something else than a request error is a down host"""
+    proxmox.hosts = ["pve1", "bad..host"]
+
+    def probe_host(host):
+        if host == "bad..host":
+            raise UnicodeError("label empty or too long")
+        return 0.1
+
+    proxmox.probe_host = probe_host
+    proxmox.select_active_node()
+    assert proxmox.host == "pve1"
+
+
+def test_select_active_node_cluster_down(proxmox):
+    """no healthy host raises ProxmoxClusterDownException"""
+    proxmox.hosts = ["pve1", "pve2"]
+    probe_answers(proxmox, {})
+    with pytest.raises(proxcli_exceptions.ProxmoxClusterDownException):
+        proxmox.select_active_node()
+
+
+class FakeAuth():
+    """minimal proxmoxer ticket authentication"""
+    def __init__(self, ticket):
+        self.pve_auth_ticket = ticket
+        self.csrf_prevention_token = f"csrf-{ticket}"
+        self.birth_time = time.monotonic()
+
+    def get_cookies(self):
+        """cookies sent with every request"""
+        return {"PVEAuthCookie": self.pve_auth_ticket}
+
+
+def test_load_ticket_ignores_stale_tickets(proxmox):
+    """expired tickets or tickets of another user are not reused"""
+    proxmox.save_ticket(FakeAuth("fresh"))
+    assert proxmox.load_ticket()["ticket"] == "fresh"
+    proxmox.username = "admin@pve"
+    assert proxmox.load_ticket() is None
+    proxmox.username = "root@pam"
+    proxmox.hosts = ["pve2"]
+    assert proxmox.load_ticket() is None
+    proxmox.hosts = ["pve1"]
+    auth = FakeAuth("old")
+    auth.birth_time -= TICKET_LIFETIME
+    proxmox.save_ticket(auth)
+    assert proxmox.load_ticket() is None
+
+
+def test_save_ticket_is_private(proxmox):
+    """ticket.json is only readable by its owner"""
+    proxmox.save_ticket(FakeAuth("secret"))
+    mode = os.stat(proxmox.proxcli_path("ticket.json")).st_mode
+    assert stat.S_IMODE(mode) == 0o600
+
+
+def test_rejected_ticket_logs_in_once(proxmox, monkeypatch):
+    """a 401 logs in again with the password and resends the request"""
+    logins = []
+
+    def login(username, password, **kwargs):
+        logins.append((username, password))
+        return FakeAuth("renewed")
+
+    monkeypatch.setattr(proxmoxlib, "ProxmoxHTTPAuth", login)
+    api = proxmox.proxmox_instance
+    api._backend.auth = FakeAuth("expired")
+    session = api._store.__getitem__.return_value
+    retried = requests.Response()
+    retried.status_code = 200
+    session.send.return_value = retried
+    request = requests.Request(
+        "POST",
+        "https://pve1:8006/api2/json/nodes/pve1/qemu/100/status/start",
+        cookies={"PVEAuthCookie": "expired"},
+        headers={"CSRFPreventionToken": "csrf-expired"}
+    ).prepare()
+    rejected = requests.Response()
+    rejected.status_code = 401
+    rejected.request = request
+    assert proxmox.track_ticket(rejected, timeout=5) is retried
+    assert logins == [("root@pam", "secret")]
+    sent = session.send.call_args
+    assert sent.kwargs == {"timeout": 5}
+    assert "PVEAuthCookie=renewed" in sent.args[0].headers["Cookie"]
+    assert sent.args[0].headers["CSRFPreventionToken"] == "csrf-renewed"
+    assert proxmox.load_ticket()["ticket"] == "renewed"
+    # the retry is not retried again
+    rejected.request = sent.args[0]
+    assert proxmox.track_ticket(rejected) is rejected
+    assert len(logins) == 1
+
+
+def test_concurrent_ticket_saves(proxmox):
+    """workers saving renewed tickets at once never corrupt ticket.json"""
+    def save(index):
+        for _ in range(5):
+            proxmox.save_ticket(FakeAuth(f"ticket-{index}"))
+
+    workers = [
+        threading.Thread(target=save, args=(index,)) for index in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert proxmox.load_ticket()["ticket"].startswith("ticket-")
+    path = proxmox.proxcli_path("ticket.json")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert os.listdir(os.path.dirname(path)).count("ticket.json") == 1
+    assert not [
+        f for f in os.listdir(os.path.dirname(path)) if f.endswith(".tmp")
+    ]
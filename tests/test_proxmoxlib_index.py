@@ -0,0 +1,39 @@
+#!/usr/bin/env pytest
+"""Test proxmoxlib vms and ha resources indexes"""
+
+RESOURCES = [
+    {"type": "qemu", "vmid": 100, "name": "web", "node": "pve1",
+     "status": "running"},
+    {"type": "qemu", "vmid": 101, "name": "db", "node": "pve2",
+     "status": "stopped", "tags": "sql"},
+    {"type": "lxc", "vmid": 200, "name": "proxy", "node": "pve2",
+     "status": "running"},
+]
+
+
+def test_vms_index(proxmox):
+    """vms are indexed by vmid, name and node from one api call"""
+    proxmox.proxmox_instance.cluster.resources.get.return_value = RESOURCES
+    index = proxmox.get_vms_index()
+    assert sorted(index.by_vmid) == [100, 101]
+    assert index.by_name["db"][0]["vmid"] == 101
+    assert [v["vmid"] for v in index.by_node["pve2"]] == [101]
+    assert proxmox.exists_vm(virtual_machine_name="web")
+    assert not proxmox.exists_vm(virtual_machine_id=200)
+    assert proxmox.get_vm_by_id_or_name(vmid="101")["tags"] == "sql"
+    assert proxmox.proxmox_instance.cluster.resources.get.call_count == 1
+
+
+def test_ha_resources_join(proxmox):
+    """ha resources are named after their vm"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = RESOURCES
+    api.cluster.ha.resources.get.return_value = [
+        {"sid": "vm:100", "group": "g1"},
+        {"sid": "vm:999", "group": "g1"},
+    ]
+    resources = proxmox.get_ha_resources(output_format="internal")
+    assert [r["name"] for r in resources] == ["web", ""]
+    assert proxmox.get_resource_by_id_or_name(vmid=100)["name"] == "web"
+    assert proxmox.vm_ha_resource_managed(999)
+    assert not proxmox.vm_ha_resource_managed(101)
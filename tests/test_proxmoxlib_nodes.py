@@ -0,0 +1,56 @@
+#!/usr/bin/env pytest
+"""Test proxmoxlib cluster wide node queries"""
+import json
+import threading
+
+
+def test_get_nodes_network_partial_results(proxmox, capsys):
+    """a stalled node does not block the others and is reported"""
+    api = proxmox.proxmox_instance
+    api.nodes.get.return_value = [
+        {"node": "pve1", "status": "online"},
+        {"node": "pve2", "status": "online"},
+        {"node": "pve3", "status": "offline"},
+    ]
+    release = threading.Event()
+
+    def node(name):
+        node_api = type(api)()
+        if name == "pve2":
+            node_api.network.get.side_effect = lambda: release.wait(5)
+        else:
+            node_api.network.get.return_value = [{"iface": "vmbr0"}]
+        return node_api
+
+    api.nodes.side_effect = node
+    try:
+        networks = proxmox.get_nodes_network(
+            proxmox_nodes="all", output_format="internal", timeout=0.2
+        )
+    finally:
+        release.set()
+    assert networks["networks"] == [{"iface": "vmbr0", "node": "pve1"}]
+    assert [f["node"] for f in networks["failed_nodes"]] == ["pve2"]
+    captured = capsys.readouterr()
+    assert "pve2" in captured.err
+    assert "pve2" not in captured.out
+
+
+def test_get_nodes_network_json_stays_parsable(proxmox, capsys):
+    """failed nodes are part of the json document, not printed before it"""
+    api = proxmox.proxmox_instance
+
+    def node(name):
+        node_api = type(api)()
+        if name == "pve2":
+            node_api.network.get.side_effect = TimeoutError("no answer")
+        else:
+            node_api.network.get.return_value = [{"iface": "vmbr0"}]
+        return node_api
+
+    api.nodes.side_effect = node
+    proxmox.get_nodes_network(proxmox_nodes="pve1,pve2", output_format="json")
+    document = json.loads(capsys.readouterr().out)
+    assert document["failed_nodes"] == [
+        {"node": "pve2", "error": "no answer"}
+    ]
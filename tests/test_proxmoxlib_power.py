@@ -0,0 +1,129 @@
+#!/usr/bin/env pytest
+"""Test proxmoxlib bulk power operations"""
+from proxmoxer import ResourceException
+
+RESOURCES = [
+    {"type": "qemu", "vmid": vmid, "name": f"k8s-{vmid}", "node": node,
+     "status": "stopped"}
+    for vmid, node in ((100, "pve1"), (101, "pve1"), (102, "pve2"))
+]
+
+
+def test_set_vms_status_summary(proxmox):
+    """power tasks are submitted, waited for and summarized"""
+    proxmox.task_polling_interval = 0
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = RESOURCES
+
+    def qemu(vmid):
+        guest = api.guests.setdefault(vmid, type(api)())
+        if vmid == 102:
+            guest.status.post.side_effect = ResourceException(
+                500, "error", "locked")
+        else:
+            guest.status.post.return_value = (
+                f"UPID:pve1:0000C2B8:004B0E5C:65A6C8D4:qmstart:{vmid}:"
+                f"root@pam:"
+            )
+        return guest
+
+    api.guests = {}
+    api.nodes.return_value.qemu.side_effect = qemu
+    api.nodes.return_value.tasks.get.return_value = [
+        {"upid": "UPID:pve1:0000C2B8:004B0E5C:65A6C8D4:qmstart:100:root@pam:",
+         "endtime": 1, "status": "OK"},
+        {"upid": "UPID:pve1:0000C2B8:004B0E5C:65A6C8D4:qmstart:101:root@pam:"},
+    ]
+    summary = proxmox.set_vms_status(
+        "start", filter_name="^k8s-", wait=True, timeout=0, node_workers=1
+    )
+    assert [v["vmid"] for v in summary["succeeded"]] == [100]
+    assert [v["vmid"] for v in summary["timeout"]] == [101]
+    assert [v["vmid"] for v in summary["failed"]] == [102]
+    api.guests[100].status.post.assert_called_once_with("start")
+
+
+def test_plan_waves_groups_by_node_and_shared_storage(proxmox):
+    """each wave takes at most wave_size vms per shared storage or node"""
+    api = proxmox.proxmox_instance
+    api.storage.get.return_value = [{"storage": "ceph", "shared": 1}]
+    disks = {100: "ceph:vm-100-disk-0", 101: "ceph:vm-101-disk-0",
+             102: "local-lvm:vm-102-disk-0", 103: "ceph:vm-103-disk-0"}
+
+    def qemu(vmid):
+        guest = type(api)()
+        guest.config.get.return_value = {"scsi0": disks[vmid]}
+        return guest
+
+    api.nodes.return_value.qemu.side_effect = qemu
+    vms = [{"vmid": vmid, "name": str(vmid), "node": node}
+           for vmid, node in ((100, "pve1"), (101, "pve1"), (102, "pve1"),
+                              (103, "pve2"))]
+    waves = proxmox.plan_waves(vms, wave_size=1)
+    # the ceph pool is shared by pve1 and pve2, its vms are spread over
+    # three waves
+    assert [[v["vmid"] for v in wave] for wave in waves] == [
+        [100, 102], [101], [103]
+    ]
+
+
+def test_delete_vms_stops_running_vms_first(proxmox):
+    """running vms are stopped in the same batch, deletions are waited for"""
+    proxmox.task_polling_interval = 0
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = [
+        dict(RESOURCES[0], status="running"),
+        RESOURCES[1],
+        dict(RESOURCES[2], status="unknown"),
+        dict(RESOURCES[1], vmid=103, name="k8s-103")
+    ]
+
+    def upid(task_type, vmid):
+        return (
+            f"UPID:pve1:0000C2B8:004B0E5C:65A6C8D4:{task_type}:{vmid}:"
+            f"root@pam:"
+        )
+
+    def qemu(vmid):
+        guest = api.guests.setdefault(vmid, type(api)())
+        guest.status.post.return_value = upid("qmstop", vmid)
+        guest.delete.return_value = upid("qmdestroy", vmid)
+        return guest
+
+    api.guests = {}
+    api.nodes.return_value.qemu.side_effect = qemu
+    api.nodes.return_value.tasks.get.return_value = [
+        {"upid": upid("qmstop", 100), "endtime": 1, "status": "OK"},
+        {"upid": upid("qmdestroy", 100), "endtime": 2, "status": "OK"},
+        {"upid": upid("qmdestroy", 101)},
+        {"upid": upid("qmdestroy", 103), "endtime": 2,
+         "status": "unable to remove disk"},
+    ]
+    summary = proxmox.delete_vms(fitler_name="^k8s-", stop=True, timeout=0)
+    assert [v["vmid"] for v in summary["succeeded"]] == [100]
+    assert [v["vmid"] for v in summary["timeout"]] == [101]
+    assert [v["vmid"] for v in summary["failed"]] == [103]
+    assert [(v["vmid"], v["status"]) for v in summary["skipped"]] == [
+        (102, "unknown")
+    ]
+    api.guests[100].status.post.assert_called_once_with("stop")
+    assert 102 not in api.guests
+
+    summary = proxmox.delete_vms(fitler_name="^k8s-", block=False)
+    assert sorted(v["vmid"] for v in summary["skipped"]) == [100, 102]
+
+
+def test_wait_wave_ready_needs_sustained_idle(proxmox):
+    """a single low io wait sample right after the starts is not enough"""
+    proxmox.task_polling_interval = 0
+    api = proxmox.proxmox_instance
+    api.nodes.return_value.status.get.side_effect = [
+        {"wait": 0.01}, {"wait": 0.6}, {"wait": 0.02}, {"wait": 0.03},
+        {"wait": 0.01}
+    ]
+    api.nodes.return_value.qemu.return_value.agent.ping.post.side_effect = (
+        ResourceException(500, "error", "agent not running")
+    )
+    vms = [{"vmid": 100, "name": "k8s-100", "node": "pve1"}]
+    assert proxmox.wait_wave_ready(vms, iowait=0.1, timeout=5)
+    assert api.nodes.return_value.status.get.call_count == 5
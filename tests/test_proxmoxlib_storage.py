@@ -0,0 +1,272 @@
+#!/usr/bin/env pytest
+"""Test proxmoxlib storage content and uploads"""
+import hashlib
+import json
+import requests
+from proxmoxer import ResourceException
+
+STORAGES = [
+    {"type": "storage", "node": node, "storage": storage, "shared": shared,
+     "status": "available"}
+    for node in ("pve1", "pve2")
+    for storage, shared in (("local", 0), ("ceph", 1))
+]
+GUESTS = [
+    {"type": "qemu", "vmid": 100, "name": "web", "node": "pve1",
+     "status": "running"},
+    {"type": "lxc", "vmid": 200, "name": "proxy", "node": "pve2",
+     "status": "running"},
+]
+
+
+def test_scan_storage_content(proxmox, capsys):
+    """shared storages are listed once and lxc volumes are not orphans"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.side_effect = (
+        lambda type: STORAGES if type == "storage" else GUESTS
+    )
+    contents = {
+        ("pve1", "ceph"): [
+            {"volid": "ceph:vm-100-disk-0", "vmid": 100, "size": 2 ** 30},
+            {"volid": "ceph:vm-101-disk-0", "vmid": 101, "size": 2 ** 30},
+        ],
+        ("pve1", "local"): [{"volid": "local:iso/a.iso", "size": 10}],
+        ("pve2", "local"): [
+            {"volid": "local:200/vm-200-disk-0.raw", "vmid": 200, "size": 1},
+            {"volid": "local:300/vm-300-disk-0.raw", "vmid": 300, "size": 1},
+        ],
+    }
+    listed = []
+
+    def node(name):
+        def storage(storage_name):
+            listed.append((name, storage_name))
+            return type(api)(**{
+                "content.get.return_value": contents[(name, storage_name)]
+            })
+        return type(api)(**{"storage.side_effect": storage})
+
+    api.nodes.side_effect = node
+    volumes = proxmox.scan_storage_content(output_format="internal")
+    assert sorted(listed) == [
+        ("pve1", "ceph"), ("pve1", "local"), ("pve2", "local")
+    ]
+    assert sorted(v["volid"] for v in volumes) == [
+        "ceph:vm-101-disk-0", "local:300/vm-300-disk-0.raw"
+    ]
+    assert api.cluster.resources.get.call_count == 2
+    capsys.readouterr()
+    proxmox.scan_storage_content(output_format="json")
+    captured = capsys.readouterr()
+    assert len(json.loads(captured.out)) == 2
+    assert "ceph: 1 orphaned volume(s)" in captured.err
+
+
+def test_clean_orphaned_storage_content(proxmox, capsys):
+    """orphans are filtered by the api and deleted as one batch"""
+    proxmox.task_polling_interval = 0
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = GUESTS
+    storage = api.nodes.return_value.storage.return_value
+    storage.content.get.return_value = [
+        {"volid": "ceph:vm-101-disk-0", "vmid": 101, "size": 2 ** 30,
+         "content": "images", "format": "raw"},
+        {"volid": "ceph:vm-102-disk-0", "vmid": 102, "size": 2 ** 30,
+         "content": "images", "format": "raw"},
+    ]
+    upid = "UPID:pve1:0000C2B8:004B0E5C:65A6C8D4:imgdel:102:root@pam:"
+    storage.content.return_value.delete.side_effect = [None, upid]
+    api.nodes.return_value.tasks.get.return_value = [
+        {"upid": upid, "endtime": 1, "status": "OK"}
+    ]
+    freed = proxmox.clean_orphaned_storage_content(
+        "pve1", "ceph", "images", "", confirm=False
+    )
+    storage.content.get.assert_called_once_with(content="images", vmid=None)
+    assert freed == {"ceph": 2 ** 31}
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "ceph: 2.00 GiB freed" in captured.err
+
+
+class TicketAuth():
+    """minimal proxmoxer ticket authentication"""
+    def __init__(self, ticket):
+        self.pve_auth_ticket = ticket
+        self.csrf_prevention_token = f"csrf-{ticket}"
+        self.birth_time = 0
+
+    def __call__(self, request):
+        request.headers["CSRFPreventionToken"] = self.csrf_prevention_token
+        return request
+
+    def get_cookies(self):
+        """cookies sent with every request"""
+        return {"PVEAuthCookie": self.pve_auth_ticket}
+
+
+class UploadSession(requests.Session):
+    """session answering uploads with the given status codes in turn"""
+    def __init__(self, statuses):
+        super().__init__()
+        self.statuses = statuses
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append({
+            "url": request.url,
+            "headers": request.headers,
+            "body": request.body.read()
+        })
+        response = requests.Response()
+        response.status_code = self.statuses.pop(0)
+        response.request = request
+        response._content = b'{"data": null}'
+        return response
+
+
+def test_storages_upload_streams_with_checksum(proxmox, tmp_path):
+    """the file is streamed with its sha256 checksum"""
+    image = tmp_path / "image.iso"
+    image.write_bytes(b"x" * 3000)
+    api = proxmox.proxmox_instance
+    session = UploadSession([200])
+    session.auth = TicketAuth("ticket")
+    api._store = {
+        "base_url": "https://pve1:8006/api2/json",
+        "session": session
+    }
+    proxmox.storages_upload(str(image), "pve1", "local", "iso")
+    sent = session.sent[0]
+    assert sent["url"].endswith("/nodes/pve1/storage/local/upload")
+    assert sent["headers"]["Cookie"] == "PVEAuthCookie=ticket"
+    assert sent["headers"]["CSRFPreventionToken"] == "csrf-ticket"
+    assert b"x" * 3000 in sent["body"]
+    assert hashlib.sha256(b"x" * 3000).hexdigest().encode() in sent["body"]
+    assert b"sha256" in sent["body"]
+
+
+def test_storages_upload_logs_in_again(proxmox, tmp_path, monkeypatch):
+    """a rejected ticket is renewed and the whole file streamed again"""
+    image = tmp_path / "image.iso"
+    image.write_bytes(b"x" * 3000)
+    api = proxmox.proxmox_instance
+    session = UploadSession([401, 200])
+    api._store = {
+        "base_url": "https://pve1:8006/api2/json",
+        "session": session
+    }
+    api._backend.auth = session.auth = TicketAuth("expired")
+    monkeypatch.setattr(
+        "proxmoxlib.ProxmoxHTTPAuth",
+        lambda username, password, **kwargs: TicketAuth("renewed")
+    )
+    proxmox.storages_upload(str(image), "pve1", "local", "iso")
+    assert [s["headers"]["Cookie"] for s in session.sent] == [
+        "PVEAuthCookie=expired", "PVEAuthCookie=renewed"
+    ]
+    assert b"x" * 3000 in session.sent[1]["body"]
+
+
+def test_storages_fetch_fans_out_to_missing_nodes(proxmox):
+    """only nodes missing the volume download it"""
+    proxmox.task_polling_interval = 0
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = [
+        r for r in STORAGES if r["storage"] == "local"
+    ] + [dict(STORAGES[0], node="pve3")]
+    volid = "local:iso/jammy.img"
+    contents = {"pve1": [{"volid": volid, "size": 10}], "pve2": [],
+                "pve3": [{"volid": volid, "size": 5}]}
+    nodes = {}
+
+    def node(name):
+        if name not in nodes:
+            nodes[name] = type(api)()
+            nodes[name].return_value.get.return_value = {"size": 10}
+            storage = nodes[name].storage.return_value
+            storage.content.get.return_value = contents[name]
+            storage.return_value.post.return_value = (
+                f"UPID:{name}:0000C2B8:004B0E5C:65A6C8D4:download:jammy.img:"
+                f"root@pam:"
+            )
+            nodes[name].tasks.get.return_value = [{
+                "upid": storage.return_value.post.return_value,
+                "endtime": 1, "status": "OK"
+            }]
+        return nodes[name]
+
+    api.nodes.side_effect = node
+    summary = proxmox.storages_fetch(
+        "https://example.org/images/jammy.img", "local"
+    )
+    assert [e["node"] for e in summary["succeeded"]] == ["pve2"]
+    assert [e["node"] for e in summary["skipped"]] == ["pve1"]
+    assert [e["node"] for e in summary["failed"]] == ["pve3"]
+    nodes["pve2"].storage.return_value.assert_called_with("download-url")
+    nodes["pve1"].storage.return_value.return_value.post.assert_not_called()
+
+
+def test_storages_fetch_without_url_metadata(proxmox, capsys):
+    """an url the node can not query is still fetched"""
+    proxmox.task_polling_interval = 0
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = [STORAGES[0]]
+    node = api.nodes.return_value
+    node.return_value.get.side_effect = ResourceException(
+        500, "Internal Server Error", "HEAD not allowed"
+    )
+    storage = node.storage.return_value
+    storage.content.get.return_value = []
+    upid = "UPID:pve1:0000C2B8:004B0E5C:65A6C8D4:download:jammy.img:root@pam:"
+    storage.return_value.post.return_value = upid
+    node.tasks.get.return_value = [
+        {"upid": upid, "endtime": 1, "status": "OK"}
+    ]
+    summary = proxmox.storages_fetch(
+        "https://example.org/images/jammy.img", "local"
+    )
+    assert [e["node"] for e in summary["succeeded"]] == ["pve1"]
+    storage.content.get.assert_called_once_with(content="iso", vmid=None)
+    assert "metadata unavailable" in capsys.readouterr().err
+
+
+def test_get_storages_capacity(proxmox):
+    """capacity records come from one cluster resources call"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = [
+        dict(r, disk=used, maxdisk=100, plugintype="dir")
+        for r, used in zip(STORAGES, (90, 10, 85, 40))
+    ]
+    storages = proxmox.get_storages(
+        output_format="internal",
+        sort_by="used_fraction",
+        reverse=True,
+        min_used=0.85
+    )
+    assert [(s["node"], s["storage"], s["avail"]) for s in storages] == [
+        ("pve1", "local", 10), ("pve2", "local", 15)
+    ]
+    assert storages[0]["used_fraction"] == 0.9
+    api.cluster.resources.get.assert_called_once_with(type="storage")
+
+
+def test_storage_scan_uses_concurrency_workers(proxmox):
+    """storage scans are sized by [concurrency], not by [power]"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.side_effect = (
+        lambda type: STORAGES if type == "storage" else GUESTS
+    )
+    api.nodes.return_value.storage.return_value.content.get.return_value = []
+    proxmox.power_workers = 1
+    proxmox.concurrency_workers = 2
+    run_parallel = proxmox.run_parallel
+    sizes = []
+
+    def spy(function, items, workers=8, timeout=None):
+        sizes.append(workers)
+        return run_parallel(function, items, workers=workers, timeout=timeout)
+
+    proxmox.run_parallel = spy
+    proxmox.scan_storage_content(output_format="internal")
+    assert sizes == [2]
@@ -0,0 +1,172 @@
+#!/usr/bin/env pytest
+"""Test proxmoxlib multiplexed task waiter"""
+import itertools
+import pytest
+import requests
+from proxmoxer import ResourceException
+import proxcli_exceptions
+
+
+def upid(node, vmid):
+    """build a task identifier"""
+    return f"UPID:{node}:0000C2B8:004B0E5C:65A6C8D4:qmdestroy:{vmid}:root@pam:"
+
+
+def test_wait_tasks_one_request_per_node(proxmox):
+    """many tasks cost one task list request per node and tick"""
+    proxmox.task_polling_interval = 0
+    upids = [upid("pve1", vmid) for vmid in range(100, 150)]
+    ticks = {"count": 0}
+
+    def tasks_get(**params):
+        # half of the tasks finish on the first tick, the rest on the second
+        ticks["count"] += 1
+        done = upids if ticks["count"] > 1 else upids[:25]
+        assert params["since"] == 1705429204
+        return [
+            {"upid": u, "endtime": 1, "status": "OK"} for u in done
+        ] + [{"upid": u} for u in upids if u not in done]
+
+    api = proxmox.proxmox_instance
+    api.nodes.return_value.tasks.get.side_effect = tasks_get
+    tasks = proxmox.wait_tasks(upids, verbose=False)
+    assert [t["upid"] for t in tasks] == upids
+    assert api.nodes.return_value.tasks.get.call_count == 2
+
+
+def test_iter_tasks_survives_network_errors(proxmox):
+    """a poll that times out is no news, the deadline still decides"""
+    proxmox.task_polling_interval = 0
+    upids = [upid("pve1", 100), upid("pve1", 101)]
+    api = proxmox.proxmox_instance
+    answers = iter([
+        requests.ReadTimeout("read timed out"),
+        [{"upid": upids[0], "endtime": 1, "status": "OK"}, {"upid": upids[1]}],
+    ])
+
+    def tasks_get(**params):
+        answer = next(answers, requests.ConnectionError("refused"))
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    api.nodes.return_value.tasks.get.side_effect = tasks_get
+    tasks = list(proxmox.iter_tasks(upids, timeout=0.2))
+    assert [(t["upid"], t["exitstatus"]) for t in tasks] == [
+        (upids[0], "OK"), (upids[1], "timeout")
+    ]
+
+
+def test_wait_tasks_reports_failures_together(proxmox):
+    """failed and timed out tasks are raised in a single exception"""
+    proxmox.task_polling_interval = 0
+    upids = [upid("pve1", 100), upid("pve2", 101), upid("pve2", 102)]
+    api = proxmox.proxmox_instance
+    api.nodes.return_value.tasks.get.return_value = [
+        {"upid": upids[0], "endtime": 1, "status": "OK"},
+        {"upid": upids[1], "endtime": 1, "status": "disk busy"},
+        {"upid": upids[2]},
+    ]
+    with pytest.raises(proxcli_exceptions.ProxmoxTasksFailedException) as exc:
+        proxmox.wait_tasks(upids, timeout=0, verbose=False)
+    assert [t["id"] for t in exc.value.tasks] == ["101", "102"]
+    assert exc.value.tasks[1]["exitstatus"] == "timeout"
+
+
+def test_vms_wait_for_status_reads_status_only(proxmox, monkeypatch):
+    """waiting polls /cluster/resources and never the guest agents"""
+    monkeypatch.setattr("time.sleep", lambda delay: None)
+    polls = [
+        [{"type": "qemu", "vmid": 100, "name": "web", "node": "pve1",
+          "status": status}] for status in ("stopped", "stopped", "running")
+    ]
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.side_effect = polls
+    proxmox.vms_wait_for_status("running", vmid=100)
+    assert api.cluster.resources.get.call_count == 3
+    api.nodes.return_value.qemu.return_value.agent.get.assert_not_called()
+
+
+def test_get_tasks_merges_node_streams(proxmox):
+    """per node lists are merged newest first up to the global limit"""
+    api = proxmox.proxmox_instance
+    api.nodes.get.return_value = [
+        {"node": "pve1", "status": "online"},
+        {"node": "pve2", "status": "online"},
+    ]
+    streams = {
+        "pve1": [{"upid": "a", "starttime": 30, "endtime": 31},
+                 {"upid": "b", "starttime": 10, "endtime": 11}],
+        "pve2": [{"upid": "c", "starttime": 40},
+                 {"upid": "d", "starttime": 20, "endtime": 21}],
+    }
+    node_apis = {
+        node: type(api)(**{"tasks.get.return_value": tasks})
+        for node, tasks in streams.items()
+    }
+    api.nodes.side_effect = node_apis.get
+    result = proxmox.get_tasks(limit=3, typefilter="qmstart")
+    assert result["failed_nodes"] == []
+    tasks = result["tasks"]
+    assert [t["upid"] for t in tasks] == ["c", "a", "d"]
+    assert tasks[0]["endtime"] == ""
+    node_apis["pve1"].tasks.get.assert_called_once_with(
+        errors=0, limit=3, source="all", typefilter="qmstart"
+    )
+
+
+def test_follow_tasks_is_incremental(proxmox, monkeypatch):
+    """only newer tasks are asked for and running ones are tracked"""
+    monkeypatch.setattr("time.sleep", lambda delay: None)
+    api = proxmox.proxmox_instance
+    api.nodes.get.return_value = [{"node": "pve1", "status": "online"}]
+    node = api.nodes.return_value
+    node.tasks.get.side_effect = [
+        [{"upid": "a", "starttime": 10, "endtime": 11},
+         {"upid": "b", "starttime": 20}],
+        [{"upid": "b", "starttime": 20},
+         {"upid": "c", "starttime": 30, "endtime": 31}],
+        [],
+    ]
+    node.tasks.return_value.status.get.return_value = {
+        "status": "stopped", "exitstatus": "OK"
+    }
+    events = list(itertools.islice(proxmox.follow_tasks(interval=0), 4))
+    assert [(e, t["upid"]) for e, t in events] == [
+        ("new", "a"), ("new", "b"), ("new", "c"), ("finished", "b")
+    ]
+    # the status endpoint gave no end time, none is made up
+    assert "endtime" not in events[3][1]
+    calls = node.tasks.get.call_args_list
+    assert "since" not in calls[0].kwargs
+    assert calls[1].kwargs["since"] == 20
+    assert calls[2].kwargs == {"source": "active"}
+
+
+def test_follow_tasks_reports_failing_nodes_once(proxmox, monkeypatch):
+    """a node that stops answering is reported, not silently dropped"""
+    monkeypatch.setattr("time.sleep", lambda delay: None)
+    api = proxmox.proxmox_instance
+    api.nodes.get.return_value = [
+        {"node": "pve1", "status": "online"},
+        {"node": "pve2", "status": "online"}
+    ]
+    node_apis = {"pve1": type(api)(), "pve2": type(api)()}
+    api.nodes.side_effect = node_apis.get
+    node_apis["pve1"].tasks.get.side_effect = [
+        [{"upid": "a", "starttime": 10, "endtime": 11}],
+        [{"upid": "b", "starttime": 20, "endtime": 21}],
+        [{"upid": "c", "starttime": 30, "endtime": 31}],
+    ]
+    node_apis["pve2"].tasks.get.side_effect = ResourceException(
+        595, "Errors during connection establishment", "no route to host"
+    )
+    reports = []
+    proxmox.report_failed_nodes = lambda what, failed: reports.append(
+        [node for node, _ in failed]
+    )
+    events = proxmox.follow_tasks(interval=0)
+    assert [t["upid"] for _, t in itertools.islice(events, 3)] == [
+        "a", "b", "c"
+    ]
+    assert reports == [["pve2"], []]
@@ -0,0 +1,73 @@
+#!/usr/bin/env pytest
+"""Test proxmoxlib vms listing and guest agent lookups"""
+import threading
+import time
+import yaml
+from proxmoxer import ResourceException
+from proxmoxlib import IP_UNKNOWN
+
+RESOURCES = [
+    {"type": "qemu", "vmid": 100, "name": "web", "node": "pve1",
+     "status": "running", "tags": "front"},
+    {"type": "qemu", "vmid": 101, "name": "db", "node": "pve1",
+     "status": "running", "tags": "sql"},
+    {"type": "qemu", "vmid": 102, "name": "old", "node": "pve2",
+     "status": "stopped", "tags": ""},
+]
+INTERFACES = {"result": [{
+    "name": "eth0",
+    "ip-addresses": [{"ip-address-type": "ipv4", "ip-address": "10.0.0.1"}]
+}]}
+
+
+def test_get_vms_per_node_fallback(proxmox):
+    """vms are listed per node when /cluster/resources is unavailable"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.side_effect = ResourceException(
+        501, "Not Implemented", "")
+    api.nodes.get.return_value = [
+        {"node": "pve1", "status": "online"},
+        {"node": "pve2", "status": "offline"}
+    ]
+    api.nodes.return_value.qemu.get.return_value = [
+        {"vmid": "100", "name": "web", "status": "running"}
+    ]
+    vms = proxmox.get_vms_snapshot()
+    assert [(v["vmid"], v["node"], v["tags"]) for v in vms] == [
+        (100, "pve1", "")
+    ]
+    api.nodes.assert_called_once_with("pve1")
+
+
+def test_slow_agent_is_unknown_within_deadline(proxmox, tmp_path):
+    """a blocked guest agent does not delay the listing past its deadline"""
+    api = proxmox.proxmox_instance
+    api.cluster.resources.get.return_value = RESOURCES
+    proxmox.agent_timeout = 0.2
+    release = threading.Event()
+
+    def qemu(vmid):
+        guest = type(api)()
+        if vmid == 101:
+            guest.agent.get.side_effect = lambda command: release.wait(5)
+        else:
+            guest.agent.get.return_value = INTERFACES
+        return guest
+
+    api.nodes.return_value.qemu.side_effect = qemu
+    try:
+        start = time.monotonic()
+        vms = proxmox.get_vms(output_format="internal")
+        elapsed = time.monotonic() - start
+        proxmox.inventory(save=str(tmp_path / "inventory.yaml"))
+    finally:
+        release.set()
+    assert elapsed < 2
+    ips = {v["vmid"]: v["ip"] for v in vms}
+    assert ips == {
+        100: [{"name": "eth0", "ip": "10.0.0.1"}],
+        101: IP_UNKNOWN,
+        102: []
+    }
+    inventory = yaml.safe_load((tmp_path / "inventory.yaml").read_text())
+    assert inventory["all"]["hosts"] == {"web": {"ansible_host": "10.0.0.1"}}